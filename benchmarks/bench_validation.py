@@ -0,0 +1,52 @@
+# benchmarks/bench_validation.py
+#
+# Validation cost of AgentRequestBody for 1 / 50 / 500 knowledge items.
+# Run from the repo root:  python -m benchmarks.bench_validation
+
+import base64
+import json
+import os
+import timeit
+
+from schemas import AgentRequestBody
+
+FILE_BYTES = 4 * 1024   # per knowledge item, before base64
+
+
+def make_body(n_items: int) -> bytes:
+    blob = base64.b64encode(os.urandom(FILE_BYTES)).decode()
+    return json.dumps({
+        "agent": {
+            "agent_type": "inbound", "campaign_name": "bench", "industry": "tech",
+            "company_name": "C", "agent_name": "A", "agent_voice": "V",
+            "agent_role": "sales", "client_id": 1,
+        },
+        "knowledge": [
+            {"file_name": f"f{i}.pdf", "file_type": "pdf", "file_size": FILE_BYTES,
+             "file_blob_base64": blob, "client_id": 1}
+            for i in range(n_items)
+        ],
+        "integration": [
+            {"client_id": 1, "status": "connected", "config": "{}", "type": "crm",
+             "connected_at": "2025-04-20T00:00:00Z"}
+        ],
+    }).encode()
+
+
+def bench(stmt, number: int) -> float:
+    # best of 5, in milliseconds per call
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1000
+
+
+def main():
+    print(f"{'items':>6} {'body KiB':>9} {'json.loads+validate ms':>23} {'validate_json ms':>17}")
+    for n_items in (1, 50, 500):
+        body = make_body(n_items)
+        number = max(1, 2000 // n_items)
+        two_step = bench(lambda: AgentRequestBody.model_validate(json.loads(body)), number)
+        one_step = bench(lambda: AgentRequestBody.model_validate_json(body), number)
+        print(f"{n_items:>6} {len(body) / 1024:>9.0f} {two_step:>23.3f} {one_step:>17.3f}")
+
+
+if __name__ == "__main__":
+    main()
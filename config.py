@@ -1,4 +1,7 @@
 import os
+from dotenv import load_dotenv
+
+load_dotenv()
 
 DB_USER = os.getenv("DB_USER", "phpmyadmin")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "NewPassword123%21")
@@ -6,4 +9,66 @@ DB_HOST = os.getenv("DB_HOST", "64.227.152.165")
 DB_PORT = os.getenv("DB_PORT", "3306")
 DB_NAME = os.getenv("DB_NAME", "wellofront")
 
-DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+)
+
+# Connections are reused across requests; recycle before MySQL's wait_timeout.
+DB_POOL_SIZE     = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW  = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE  = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# -------------------- Read Replicas --------------------
+# comma-separated SQLAlchemy URLs; read-only routes are spread across them
+DB_REPLICA_URLS                 = [u.strip() for u in os.getenv("DB_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_MAX_LAG_SECONDS         = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "2"))
+REPLICA_LAG_CHECK_SECONDS       = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
+REPLICA_STICKY_SECONDS          = int(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+REPLICA_CONNECT_TIMEOUT_SECONDS = int(os.getenv("REPLICA_CONNECT_TIMEOUT_SECONDS", "2"))
+
+# -------------------- Admission Control --------------------
+RATE_LIMIT_PER_SECOND  = float(os.getenv("RATE_LIMIT_PER_SECOND", "5"))
+RATE_LIMIT_BURST       = int(os.getenv("RATE_LIMIT_BURST", "20"))
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", "4"))
+MAX_IN_FLIGHT_REQUESTS = int(os.getenv("MAX_IN_FLIGHT_REQUESTS", "64"))
+MAX_OPEN_STREAMS       = int(os.getenv("MAX_OPEN_STREAMS", "256"))   # /changes SSE + long-polls
+POOL_SHED_THRESHOLD    = float(os.getenv("POOL_SHED_THRESHOLD", "1.0"))
+RATE_LIMIT_REDIS_URL   = os.getenv("RATE_LIMIT_REDIS_URL")
+
+# -------------------- Soft Delete Reaper --------------------
+# 0 disables the in-process thread (run `python -m lib.reaper` on a schedule instead)
+REAPER_INTERVAL_SECONDS = float(os.getenv("REAPER_INTERVAL_SECONDS", "30"))
+REAPER_BATCH_SIZE       = int(os.getenv("REAPER_BATCH_SIZE", "500"))
+
+# -------------------- Blob Content Cache --------------------
+# shared on-disk LRU for GET /knowledge/{id}/content; unset to disable
+BLOB_CACHE_DIR            = os.getenv("BLOB_CACHE_DIR")
+BLOB_CACHE_MAX_BYTES      = int(os.getenv("BLOB_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+BLOB_CACHE_MAX_FILE_BYTES = int(os.getenv("BLOB_CACHE_MAX_FILE_BYTES", str(64 * 1024 * 1024)))
+
+# -------------------- Change Feed --------------------
+# rows younger than the delay are withheld from /changes: ids are allocated at
+# INSERT but become visible at COMMIT, so a fresh row can still be overtaken by
+# a lower id committing late. Keep it above the longest write transaction.
+CHANGE_VISIBILITY_DELAY_SECONDS = float(os.getenv("CHANGE_VISIBILITY_DELAY_SECONDS", "2"))
+# the reaper drops older rows (only once dispatched when WEBHOOK_URL is set)
+CHANGE_RETENTION_SECONDS        = float(os.getenv("CHANGE_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+# batched webhook delivery of the Changes outbox; unset WEBHOOK_URL to disable
+WEBHOOK_URL              = os.getenv("WEBHOOK_URL")
+WEBHOOK_INTERVAL_SECONDS = float(os.getenv("WEBHOOK_INTERVAL_SECONDS", "2"))
+WEBHOOK_BATCH_SIZE       = int(os.getenv("WEBHOOK_BATCH_SIZE", "200"))
+WEBHOOK_TIMEOUT_SECONDS  = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+
+# -------------------- Bulk Export / Import --------------------
+EXPORT_PAGE_SIZE  = int(os.getenv("EXPORT_PAGE_SIZE", "100"))    # agents per keyset page
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "100"))
+
+# -------------------- Request Size Limits --------------------
+# enforced while the body streams in (413), before Pydantic sees it
+MAX_BODY_BYTES        = int(os.getenv("MAX_BODY_BYTES", str(50 * 1024 * 1024)))
+MAX_IMPORT_BODY_BYTES = int(os.getenv("MAX_IMPORT_BODY_BYTES", str(1024 * 1024 * 1024)))
+MAX_FILE_BYTES        = int(os.getenv("MAX_FILE_BYTES", str(10 * 1024 * 1024)))
+MAX_KNOWLEDGE_ITEMS   = int(os.getenv("MAX_KNOWLEDGE_ITEMS", "500"))
+MAX_INTEGRATION_ITEMS = int(os.getenv("MAX_INTEGRATION_ITEMS", "50"))
@@ -0,0 +1,167 @@
+# lib/changes.py
+
+import json
+import threading
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+import config
+from models import Agent, Change, engine
+
+# never leave the database in a change payload
+_SECRET_COLUMNS = {"access_token", "refresh_token"}
+
+
+def _payload(entity) -> dict:
+    data = {}
+    for column in entity.__table__.columns:
+        if column.name in _SECRET_COLUMNS:
+            continue
+        value = getattr(entity, column.name)
+        data[column.name] = value.isoformat() if isinstance(value, datetime) else value
+    return data
+
+
+def _change_row(entity, op: str) -> dict:
+    return {
+        "client_id":   entity.client_id,
+        "agent_id":    entity.identity if isinstance(entity, Agent) else entity.agent_id,
+        "entity_type": entity.__tablename__,
+        "entity_id":   entity.identity,
+        "op":          op,
+        "payload":     None if op == "deleted" else json.dumps(_payload(entity)),
+    }
+
+
+def record_change(db: Session, entity, op: str) -> None:
+    """
+    Add an outbox row for `entity` to the current transaction, so it
+    commits (or rolls back) together with the change itself.
+    `entity` must already have its identity (flush first when creating).
+    """
+    db.add(Change(**_change_row(entity, op)))
+
+
+def record_changes(db: Session, entities, op: str) -> None:
+    """
+    `record_change` for many entities with one multi-row INSERT.
+    """
+    rows = [_change_row(entity, op) for entity in entities]
+    if rows:
+        db.execute(insert(Change), rows)
+
+
+def change_to_dict(change: Change) -> dict:
+    return {
+        "id":          change.identity,
+        "client_id":   change.client_id,
+        "agent_id":    change.agent_id,
+        "entity_type": change.entity_type,
+        "entity_id":   change.entity_id,
+        "op":          change.op,
+        "payload":     json.loads(change.payload) if change.payload else None,
+        "created_at":  change.created_at.isoformat(),
+    }
+
+
+def changes_since(db: Session, since: int, client_id: int = None, limit: int = 100) -> list:
+    """
+    Changes with identity > `since`, oldest first. Rows younger than
+    CHANGE_VISIBILITY_DELAY_SECONDS are held back so a lower id that commits
+    late is never skipped by a cursor that already moved past it.
+    """
+    settled = datetime.utcnow() - timedelta(seconds=config.CHANGE_VISIBILITY_DELAY_SECONDS)
+    query = select(Change).where(Change.identity > since, Change.created_at <= settled)
+    if client_id is not None:
+        query = query.where(Change.client_id == client_id)
+    return [change_to_dict(c) for c in db.scalars(query.order_by(Change.identity).limit(limit))]
+
+
+# -------------------- Webhook Dispatcher --------------------
+
+_DISPATCH_LOCK = "changes_dispatcher"
+
+
+def dispatch_batch(db: Session, url: str, batch_size: int, timeout: float) -> int:
+    """
+    POST the next batch of settled, undelivered changes as one JSON array
+    and mark them dispatched. Returns the batch size. Callers must hold the
+    dispatcher lock (see `dispatch_pending`), which is what keeps delivery
+    in id order.
+    """
+    settled = datetime.utcnow() - timedelta(seconds=config.CHANGE_VISIBILITY_DELAY_SECONDS)
+    batch = db.scalars(
+        select(Change)
+        .where(Change.dispatched_at.is_(None), Change.created_at <= settled)
+        .order_by(Change.identity)
+        .limit(batch_size)
+    ).all()
+    payload = [change_to_dict(c) for c in batch]
+    db.rollback()   # no transaction held open across the POST
+    if not payload:
+        return 0
+    resp = requests.post(url, json=payload, timeout=timeout)
+    resp.raise_for_status()
+    db.execute(
+        update(Change)
+        .where(Change.identity.in_([c["id"] for c in payload]))
+        .values(dispatched_at=datetime.utcnow())
+    )
+    db.commit()
+    return len(payload)
+
+
+def _try_dispatch_lock(conn) -> bool:
+    if conn.dialect.name != "mysql":
+        return True   # SQLite: a single process, nothing to coordinate
+    held = conn.exec_driver_sql(f"SELECT GET_LOCK('{_DISPATCH_LOCK}', 0)").scalar()
+    conn.commit()
+    return held == 1
+
+
+def dispatch_pending(url: str, batch_size: int, timeout: float) -> int:
+    """
+    Drain the outbox in id order. A MySQL advisory lock (GET_LOCK, any
+    version) lets one worker dispatch at a time, so a failed batch is
+    retried before anything newer goes out. Delivery is at-least-once:
+    a batch can repeat if marking it fails after the POST succeeded.
+    Returns rows delivered; 0 if another worker holds the lock.
+    """
+    total = 0
+    with engine.connect() as conn:
+        if not _try_dispatch_lock(conn):
+            return 0
+        try:
+            # the lock belongs to this connection, so the session must use it
+            with Session(bind=conn) as db:
+                while True:
+                    sent = dispatch_batch(db, url, batch_size, timeout)
+                    total += sent
+                    if sent < batch_size:
+                        break
+        finally:
+            if conn.dialect.name == "mysql":
+                conn.exec_driver_sql(f"DO RELEASE_LOCK('{_DISPATCH_LOCK}')")
+                conn.commit()
+    return total
+
+
+def start_dispatcher(url: str, interval: float, batch_size: int, timeout: float) -> threading.Event:
+    """
+    Deliver outbox rows to `url` on a daemon thread; drains full batches
+    back to back, then sleeps `interval`. Set the returned event to stop.
+    """
+    stop = threading.Event()
+
+    def _loop():
+        while not stop.wait(interval):
+            try:
+                dispatch_pending(url, batch_size, timeout)
+            except Exception as exc:   # delivery is retried on the next pass
+                print(">>> WEBHOOK DISPATCH ERROR:", exc)
+
+    threading.Thread(target=_loop, name="webhook-dispatcher", daemon=True).start()
+    return stop
@@ -0,0 +1,103 @@
+# lib/limits.py
+
+from fastapi import Request
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+
+# Pydantic error types produced by the max_length limits in schemas.py, and
+# the fields whose limits are about payload size rather than shape
+_SIZE_ERRORS = {"too_long", "string_too_long"}
+_SIZE_FIELDS = {"file_blob_base64", "knowledge", "integration"}
+
+
+class BodySizeLimitMiddleware:
+    """
+    Reject request bodies over `max_bytes` with 413: up front when
+    Content-Length says so, otherwise as soon as the streamed bytes cross
+    the limit, so an oversized body is never fully buffered.
+    `overrides` maps path prefixes to their own limit.
+    """
+
+    def __init__(self, app, max_bytes: int, overrides: dict = None):
+        self.app       = app
+        self.max_bytes = max_bytes
+        self.overrides = overrides or {}
+
+    def _limit_for(self, path: str) -> int:
+        for prefix, limit in self.overrides.items():
+            if path.startswith(prefix):
+                return limit
+        return self.max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        limit = self._limit_for(scope["path"])
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None:
+            try:
+                declared = int(content_length)
+            except ValueError:
+                declared = -1
+            if declared < 0:
+                response = JSONResponse(status_code=400, content={"detail": "Invalid Content-Length"})
+                return await response(scope, receive, send)
+            if declared > limit:
+                return await _too_large(scope, receive, send)
+
+        received, started, rejected = 0, False, False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # answer here rather than raising: whatever the app makes of
+                    # the exception (400 from body parsing, 500 from a handler)
+                    # would otherwise be what the client sees
+                    rejected = True
+                    if not started:
+                        await _too_large(scope, receive, send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if rejected and not started:
+                return   # the 413 has been sent; drop the app's own reply
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            # the app failing on the disconnect we fed it is expected
+            if not rejected:
+                raise
+
+
+async def _too_large(scope, receive, send):
+    response = JSONResponse(status_code=413, content={"detail": "Request body too large"})
+    await response(scope, receive, send)
+
+
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    """
+    Report per-file / per-list size violations as 413, everything else
+    (including an over-long `config`) as the usual 422.
+    """
+    too_large = [
+        err for err in exc.errors()
+        if err.get("type") in _SIZE_ERRORS and err.get("loc") and err["loc"][-1] in _SIZE_FIELDS
+    ]
+    if too_large:
+        # drop "input": echoing a multi-megabyte payload back defeats the point
+        detail = [{k: v for k, v in err.items() if k != "input"} for err in too_large]
+        return JSONResponse(status_code=413, content={"detail": detail})
+    return await request_validation_exception_handler(request, exc)
@@ -0,0 +1,287 @@
+# lib/rate_limit.py
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+
+# -------------------- Backends --------------------
+
+class InMemoryBackend:
+    """
+    Per-process token buckets and concurrency counters.
+    Good enough for a single worker; use RedisBackend to share across workers.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock   = clock
+        self._lock    = threading.Lock()
+        self._buckets = {}   # key -> (tokens, last_refill)
+        self._slots   = {}   # key -> in-flight count
+        self._swept   = clock()
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        """
+        Take one token from `key`'s bucket.
+        Returns 0 if allowed, otherwise seconds until a token is available.
+        """
+        with self._lock:
+            now = self._clock()
+            self._evict_idle(now, burst / rate)
+            tokens, last = self._buckets.get(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - last) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+    def _evict_idle(self, now: float, refill_time: float) -> None:
+        # a bucket idle for `refill_time` is full again, same as a missing one;
+        # keys come from request bodies, so without this the dict grows unbounded
+        if now - self._swept < refill_time:
+            return
+        self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < refill_time}
+        self._swept = now
+
+    def acquire(self, key: str, limit: int) -> bool:
+        with self._lock:
+            count = self._slots.get(key, 0)
+            if count >= limit:
+                return False
+            self._slots[key] = count + 1
+            return True
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            count = self._slots.get(key, 0) - 1
+            if count > 0:
+                self._slots[key] = count
+            else:
+                self._slots.pop(key, None)
+
+
+# Token bucket kept in a Redis hash; refilled and decremented atomically.
+_TAKE_SCRIPT = """
+local rate   = tonumber(ARGV[1])
+local burst  = tonumber(ARGV[2])
+local now    = tonumber(ARGV[3])
+local state  = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local last   = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - last) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+# Concurrency slots: check-and-increment and clamped decrement, each atomic.
+_ACQUIRE_SCRIPT = """
+local count = tonumber(redis.call('GET', KEYS[1]) or '0')
+if count >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+_RELEASE_SCRIPT = """
+local count = tonumber(redis.call('GET', KEYS[1]) or '0')
+if count > 0 then
+    redis.call('DECR', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisBackend:
+    """
+    Shared backend so limits hold across workers/instances.
+    `client` is any redis-py compatible client with Lua `eval` (fakeredis works locally).
+    """
+
+    def __init__(self, client, prefix: str = "rl:", slot_ttl: int = 300):
+        self._client   = client
+        self._prefix   = prefix
+        self._slot_ttl = slot_ttl
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        wait = self._client.eval(
+            _TAKE_SCRIPT, 1, f"{self._prefix}tb:{key}", rate, burst, time.time()
+        )
+        return float(wait)
+
+    def acquire(self, key: str, limit: int) -> bool:
+        # TTL guards against counters leaked by crashed workers
+        return bool(self._client.eval(
+            _ACQUIRE_SCRIPT, 1, f"{self._prefix}cc:{key}", limit, self._slot_ttl
+        ))
+
+    def release(self, key: str) -> None:
+        # never below zero, even if the TTL already reset the counter
+        self._client.eval(_RELEASE_SCRIPT, 1, f"{self._prefix}cc:{key}")
+
+
+def backend_from_url(url: str = None):
+    """
+    RedisBackend when a URL is configured, otherwise InMemoryBackend.
+    """
+    if not url:
+        return InMemoryBackend()
+    import redis  # optional dependency, only needed for the shared backend
+    return RedisBackend(redis.Redis.from_url(url))
+
+
+# -------------------- Admission Control --------------------
+
+def pool_utilisation(engine) -> float:
+    """
+    Fraction of the connection pool currently checked out (0 for pools
+    that don't expose sizing, e.g. SQLite's).
+    """
+    pool = engine.pool
+    if not hasattr(pool, "checkedout") or not hasattr(pool, "size"):
+        return 0.0
+    capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+    if capacity <= 0:
+        return 0.0
+    return pool.checkedout() / capacity
+
+
+class AdmissionController:
+    """
+    Per-client token-bucket rate limits, per-client upload concurrency caps
+    and global load shedding. Long-lived streams (SSE, long-polls) count
+    against `max_streams`, not `max_in_flight`, so idle subscribers can't
+    starve ordinary requests.
+    """
+
+    def __init__(
+        self,
+        backend,
+        rate:            float,
+        burst:           int,
+        max_uploads:     int,
+        max_in_flight:   int,
+        pool_threshold:  float = 1.0,
+        engine           = None,
+        max_streams:     int = 256,
+    ):
+        self.backend        = backend
+        self.rate           = rate
+        self.burst          = burst
+        self.max_uploads    = max_uploads
+        self.max_in_flight  = max_in_flight
+        self.pool_threshold = pool_threshold
+        self.engine         = engine
+        self.max_streams    = max_streams
+        self._in_flight     = 0
+        self._streams       = 0
+        self._lock          = threading.Lock()
+
+    # ---- global load shedding ----
+
+    def enter(self, stream: bool = False) -> bool:
+        """
+        Register an in-flight request (or a long-lived stream).
+        Returns False if it should be shed.
+        """
+        if self.engine is not None and pool_utilisation(self.engine) >= self.pool_threshold:
+            return False
+        with self._lock:
+            if stream:
+                if self._streams >= self.max_streams:
+                    return False
+                self._streams += 1
+                return True
+            if self._in_flight >= self.max_in_flight:
+                return False
+            self._in_flight += 1
+            return True
+
+    def exit(self, stream: bool = False) -> None:
+        with self._lock:
+            if stream:
+                self._streams -= 1
+            else:
+                self._in_flight -= 1
+
+    # ---- per-client limits ----
+
+    def check_rate(self, client_id: int, route: str) -> None:
+        """
+        Raise 429 if `client_id` has exhausted its bucket for `route`.
+        """
+        wait = self.backend.take(f"{client_id}:{route}", self.rate, self.burst)
+        if wait > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+    @contextmanager
+    def upload_slot(self, client_id: int):
+        """
+        Hold one of `client_id`'s concurrent upload slots for the duration
+        of the block; raise 429 if all are in use.
+        """
+        key = f"uploads:{client_id}"
+        if not self.backend.acquire(key, self.max_uploads):
+            raise HTTPException(
+                status_code=429,
+                detail="Too many concurrent uploads",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            yield
+        finally:
+            self.backend.release(key)
+
+
+class LoadSheddingMiddleware:
+    """
+    Fail fast with 503 when the worker is saturated instead of queueing.
+    Plain ASGI so the slot is held until the response body has been fully
+    sent, including streamed responses (export, blob content). Paths under
+    `stream_prefixes` may stay open indefinitely and use the stream cap.
+    """
+
+    def __init__(self, app, admission: AdmissionController, stream_prefixes: tuple = ()):
+        self.app             = app
+        self.admission       = admission
+        self.stream_prefixes = tuple(stream_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stream = scope["path"].startswith(self.stream_prefixes) if self.stream_prefixes else False
+        if not self.admission.enter(stream):
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server busy, retry later"},
+                headers={"Retry-After": "1"},
+            )
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.exit(stream)
+
+
+def get_admission(request: Request) -> AdmissionController:
+    """
+    Dependency returning the app-wide controller created by `create_app`.
+    """
+    return request.app.state.admission
@@ -0,0 +1,123 @@
+# lib/reaper.py
+
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+import config
+from models import Agent, Change, Knowledge, Integration, SessionLocal
+from storage.blob import blob_name_from_url, delete_blobs
+
+
+def _reap_knowledge(db: Session, batch_size: int) -> int:
+    rows = db.execute(
+        select(Knowledge.identity, Knowledge.file_url)
+        .where(Knowledge.deleted_at.isnot(None))
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return 0
+    # an imported copy points at the same blob as its source; keep it while
+    # any live row still references it
+    urls = {url for _, url in rows if url}
+    shared = set(db.scalars(
+        select(Knowledge.file_url).where(Knowledge.file_url.in_(urls), Knowledge.deleted_at.is_(None))
+    )) if urls else set()
+    # blobs first: a crash afterwards leaves rows to retry, never orphaned blobs
+    names = [name for name in (blob_name_from_url(url) for url in urls - shared) if name]
+    if names:
+        delete_blobs(names)
+    db.execute(delete(Knowledge).where(Knowledge.identity.in_([i for i, _ in rows])))
+    db.commit()
+    return len(rows)
+
+
+def _reap_integrations(db: Session, batch_size: int) -> int:
+    ids = db.scalars(
+        select(Integration.identity)
+        .where(Integration.deleted_at.isnot(None))
+        .limit(batch_size)
+    ).all()
+    if not ids:
+        return 0
+    db.execute(delete(Integration).where(Integration.identity.in_(ids)))
+    db.commit()
+    return len(ids)
+
+
+def _reap_agents(db: Session, batch_size: int) -> int:
+    # only agents whose children are already gone, so no row-by-row cascade
+    ids = db.scalars(
+        select(Agent.identity)
+        .where(
+            Agent.deleted_at.isnot(None),
+            ~select(Knowledge.identity).where(Knowledge.agent_id == Agent.identity).exists(),
+            ~select(Integration.identity).where(Integration.agent_id == Agent.identity).exists(),
+        )
+        .limit(batch_size)
+    ).all()
+    if not ids:
+        return 0
+    db.execute(delete(Agent).where(Agent.identity.in_(ids)))
+    db.commit()
+    return len(ids)
+
+
+def _reap_changes(db: Session, batch_size: int) -> int:
+    # outbox rows past retention; keep undelivered ones while a webhook is configured
+    cutoff = datetime.utcnow() - timedelta(seconds=config.CHANGE_RETENTION_SECONDS)
+    query = select(Change.identity).where(Change.created_at < cutoff)
+    if config.WEBHOOK_URL:
+        query = query.where(Change.dispatched_at.isnot(None))
+    ids = db.scalars(query.limit(batch_size)).all()
+    if not ids:
+        return 0
+    db.execute(delete(Change).where(Change.identity.in_(ids)))
+    db.commit()
+    return len(ids)
+
+
+def reap_deleted(db: Session, batch_size: int = 500) -> int:
+    """
+    Hard-delete soft-deleted rows in bounded batches (children before
+    agents) and remove the blobs they reference, then trim the Changes
+    outbox past CHANGE_RETENTION_SECONDS. Returns rows removed.
+    """
+    total = 0
+    for reap in (_reap_knowledge, _reap_integrations, _reap_agents, _reap_changes):
+        while True:
+            removed = reap(db, batch_size)
+            total += removed
+            if removed < batch_size:
+                break
+    return total
+
+
+def start_reaper(interval: float, batch_size: int = 500) -> threading.Event:
+    """
+    Run `reap_deleted` every `interval` seconds on a daemon thread.
+    Set the returned event to stop it.
+    """
+    stop = threading.Event()
+
+    def _loop():
+        while not stop.wait(interval):
+            db = SessionLocal()
+            try:
+                reap_deleted(db, batch_size)
+            except Exception as exc:   # keep the loop alive; next pass retries
+                db.rollback()
+                print(">>> REAPER ERROR:", exc)
+            finally:
+                db.close()
+
+    threading.Thread(target=_loop, name="reaper", daemon=True).start()
+    return stop
+
+
+if __name__ == "__main__":
+    # one-off sweep, e.g. from a scheduler where a background thread won't live
+    with SessionLocal() as session:
+        print("reaped", reap_deleted(session), "rows")
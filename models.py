@@ -1,22 +1,147 @@
 # models.py
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, create_engine
+import itertools
+import threading
+import time
+from fastapi import Request, Response
+from sqlalchemy import Column, Integer, BigInteger, String, Text, ForeignKey, DateTime, Index, create_engine
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import relationship, sessionmaker
 from datetime import datetime
-from config import DATABASE_URL
+import config
+from lib.rate_limit import pool_utilisation
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
-engine = create_engine(DATABASE_URL)
+
+def _create_engine(url: str, **connect_args):
+    # one engine per database per process; every router shares its connection pool
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(
+        url,
+        pool_size     = config.DB_POOL_SIZE,
+        max_overflow  = config.DB_MAX_OVERFLOW,
+        pool_recycle  = config.DB_POOL_RECYCLE,
+        pool_pre_ping = True,
+        connect_args  = connect_args,
+    )
+
+engine = _create_engine(config.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Dependency to get DB session
-def get_db():
+# ----------------- Read Replicas -----------------
+
+class _Replica:
+    def __init__(self, url: str):
+        # fail fast on a dead host instead of the driver's 10s default
+        self.engine     = _create_engine(url, connect_timeout=config.REPLICA_CONNECT_TIMEOUT_SECONDS)
+        self.lag        = None   # seconds behind primary; None = unknown/broken
+        self.checked_at = None
+        self.probing    = False
+
+replicas = [_Replica(url) for url in config.DB_REPLICA_URLS]
+_next_replica = itertools.count()
+_lag_lock = threading.Lock()
+
+def _replica_lag(replica_engine):
+    """
+    Seconds the replica is behind its source, or None if replication is
+    not running. Non-MySQL replicas (local SQLite copies) report 0.
+    """
+    if replica_engine.dialect.name != "mysql":
+        return 0.0
+    with replica_engine.connect() as conn:
+        try:
+            row = conn.exec_driver_sql("SHOW REPLICA STATUS").mappings().first()
+        except DBAPIError:   # MySQL < 8.0.22
+            row = conn.exec_driver_sql("SHOW SLAVE STATUS").mappings().first()
+    if row is None:
+        return None
+    lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+    return None if lag is None else float(lag)
+
+def _probe_lag(replica: _Replica) -> None:
+    try:
+        lag = _replica_lag(replica.engine)
+    except Exception:   # unreachable replica: route around it
+        lag = None
+    with _lag_lock:
+        replica.lag, replica.checked_at, replica.probing = lag, time.monotonic(), False
+
+def _refresh_lag(replica: _Replica) -> None:
+    """
+    Start a background lag probe when the last one is stale. Requests never
+    wait on it: they route on the last known lag meanwhile.
+    """
+    with _lag_lock:   # guards the flags only, never held across I/O
+        if replica.probing:
+            return
+        if replica.checked_at is not None and time.monotonic() - replica.checked_at < config.REPLICA_LAG_CHECK_SECONDS:
+            return
+        replica.probing = True
+    threading.Thread(target=_probe_lag, args=(replica,), name="replica-lag", daemon=True).start()
+
+def get_read_engine():
+    """
+    Round-robin over replicas within REPLICA_MAX_LAG_SECONDS whose pool is
+    below POOL_SHED_THRESHOLD; the primary when none are configured or all
+    are lagging/unreachable/not yet probed/saturated. Load shedding only
+    watches the primary pool, so a full replica pool must not take reads.
+    """
+    healthy = []
+    for replica in replicas:
+        _refresh_lag(replica)
+        if replica.lag is None or replica.lag > config.REPLICA_MAX_LAG_SECONDS:
+            continue
+        if pool_utilisation(replica.engine) >= config.POOL_SHED_THRESHOLD:
+            continue
+        healthy.append(replica)
+    if not healthy:
+        return engine
+    return healthy[next(_next_replica) % len(healthy)].engine
+
+# Read-your-writes: after a write, the client's reads stay on the primary
+# until this cookie expires. Non-browser clients can send
+# `X-Read-Consistency: primary` instead.
+STICKY_COOKIE = "db_primary_until"
+
+def _wants_primary(request: Request) -> bool:
+    if request.headers.get("x-read-consistency") == "primary":
+        return True
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+# Dependency to get DB session (primary; use for any handler that writes)
+def get_db(request: Request, response: Response):
+    if replicas and request.method not in ("GET", "HEAD", "OPTIONS"):
+        response.set_cookie(
+            STICKY_COOKIE,
+            str(int(time.time() + config.REPLICA_STICKY_SECONDS)),
+            max_age=config.REPLICA_STICKY_SECONDS,
+            httponly=True,
+        )
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
+def read_engine_for(request: Request):
+    """
+    Engine for a read-only request: a replica unless the client needs the primary.
+    """
+    return engine if _wants_primary(request) else get_read_engine()
+
+# Dependency for read-only handlers
+def get_read_db(request: Request):
+    db = SessionLocal(bind=read_engine_for(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
 # ----------------- Table Models -----------------
 
 class User(Base):
@@ -46,6 +171,7 @@ class Agent(Base):
     agent_voice = Column(String(255), nullable=False)
     agent_role = Column(String(255), nullable=False)
     client_id = Column(Integer, ForeignKey("Users.client_id", ondelete="CASCADE"), nullable=False)
+    deleted_at = Column(DateTime, index=True)
 
     knowledge_files = relationship("Knowledge", backref="agent", cascade="all, delete")
     integrations = relationship("Integration", backref="agent", cascade="all, delete")
@@ -59,8 +185,15 @@ class Knowledge(Base):
     file_name = Column(String(255), index=True, nullable=False)
     file_type = Column(String(100))
     file_size = Column(Integer)
-    file_url = Column(String(512))
+    file_url = Column(String(512), index=True)   # reaper checks for shared blobs
     upload_date = Column(DateTime, default=datetime.utcnow)
+    deleted_at = Column(DateTime, index=True)
+
+    # keyset pagination for per-agent listings of live rows:
+    # WHERE agent_id = ? AND deleted_at IS NULL ORDER BY upload_date, identity
+    __table_args__ = (
+        Index("ix_knowledge_agent_upload", "agent_id", "deleted_at", "upload_date", "identity"),
+    )
 
 class Integration(Base):
     __tablename__ = "Integrations"
@@ -75,3 +208,25 @@ class Integration(Base):
     refresh_token = Column(String(2048))
     expires_at = Column(DateTime)
     connected_at = Column(DateTime)
+    deleted_at = Column(DateTime, index=True)
+
+class Change(Base):
+    """
+    Outbox row written in the same transaction as the entity change;
+    `identity` is the cursor consumers pass back as `since`.
+    """
+    __tablename__ = "Changes"
+
+    identity = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    client_id = Column(Integer, nullable=False)
+    agent_id = Column(Integer)
+    entity_type = Column(String(50), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String(20), nullable=False)
+    payload = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    dispatched_at = Column(DateTime, index=True)
+
+    __table_args__ = (
+        Index("ix_changes_client_identity", "client_id", "identity"),
+    )
@@ -1,10 +1,16 @@
 # schemas.py
-from pydantic import BaseModel
+import json
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timezone
 from typing       import Optional
 from typing       import Literal
 
+import config
+
+# base64 inflates 3 bytes to 4 characters
+_MAX_BASE64_CHARS = -(-config.MAX_FILE_BYTES // 3) * 4
+
 
 # ----------------- Request Schemas -----------------
 
@@ -13,7 +19,7 @@ class KnowledgeRequest(BaseModel):
     file_type: str
     file_size: int
     file_url: Optional[str] = None
-    file_blob_base64: Optional[str] = None
+    file_blob_base64: Optional[str] = Field(None, max_length=_MAX_BASE64_CHARS)
     client_id: int
     agent_id: Optional[int] = None
     upload_date: Optional[datetime] = None
@@ -31,21 +37,46 @@ class AgentRequest(BaseModel):
 class IntegrationRequest(BaseModel):
     client_id: int
     status: str
-    config: str
+    config: str = Field(max_length=1024)    # JSON object, stored as text
     type: str
-    connected_at: str
+    connected_at: Optional[datetime]         # required, but NULL rows export as null
     agent_id: Optional[int] = None
 
+    @field_validator("config")
+    @classmethod
+    def config_is_json_object(cls, v: str) -> str:
+        try:
+            parsed = json.loads(v)
+        except ValueError:
+            raise ValueError("config must be valid JSON")
+        if not isinstance(parsed, dict):
+            raise ValueError("config must be a JSON object")
+        return v
+
+    @field_validator("connected_at")
+    @classmethod
+    def connected_at_naive_utc(cls, v: Optional[datetime]) -> Optional[datetime]:
+        # DB columns hold naive UTC, like datetime.utcnow()
+        if v is not None and v.tzinfo is not None:
+            v = v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+
 class AgentRequestBody(BaseModel):
     agent: AgentRequest
-    knowledge: List[KnowledgeRequest]
-    integration: List[IntegrationRequest]
+    knowledge: List[KnowledgeRequest] = Field(max_length=config.MAX_KNOWLEDGE_ITEMS)
+    integration: List[IntegrationRequest] = Field(max_length=config.MAX_INTEGRATION_ITEMS)
 
 # PKCE Google login request + response
 class GooglePKCERequest(BaseModel):
     code: str
     verifier: str
 
+class CalendarCodeExchangeRequest(BaseModel):
+    code: str
+    verifier: str
+    client_id: int
+    agent_id: int
+
 class GoogleLoginResponse(BaseModel):
     client_id: int
     message: str
@@ -65,6 +96,27 @@ class GoogleProfileRequest(BaseModel):
 # ----------------- Response Schemas -----------------
 # (you may add more response models below as needed)
 
+class KnowledgeResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    identity:    int
+    agent_id:    int
+    client_id:   int
+    file_name:   str
+    file_type:   Optional[str] = None
+    file_size:   Optional[int] = None
+    file_url:    Optional[str] = None
+    upload_date: Optional[datetime] = None
+
+class KnowledgePage(BaseModel):
+    items:       List[KnowledgeResponse]
+    next_cursor: Optional[str] = None
+
+class KnowledgeStats(BaseModel):
+    agent_id:   int
+    file_count: int
+    total_size: int
+
 
 
 # from pydantic import BaseModel
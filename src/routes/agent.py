@@ -1,42 +1,136 @@
+from contextlib import nullcontext
+from datetime import datetime
+
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from src.models import Agent, get_db
-from src.schemas import AgentRequest, AgentRequestBody
+from models import Agent, Knowledge, Integration, get_db, get_read_db
+from schemas import AgentRequest, AgentRequestBody
+from storage.blob import upload_file_to_blob
+from lib.rate_limit import AdmissionController, get_admission
+from lib.changes import record_change
 
 router = APIRouter()
 
-@router.post("/", summary="Create agent with knowledge & integrations (legacy)")
-def create_agent_with_knowledge(body: AgentRequestBody, db: Session = Depends(get_db)):
-    agent_data = body.agent
-    db_agent = Agent(**agent_data.dict())
+def require_live_agent(db: Session, agent_id: int) -> Agent:
+    """
+    404 unless the agent exists and isn't soft-deleted. The row lock makes
+    a concurrent delete_agent wait, so its child UPDATE sees our new row.
+    """
+    agent = None
+    if agent_id is not None:
+        agent = (
+            db.query(Agent)
+            .filter(Agent.identity == agent_id, Agent.deleted_at.is_(None))
+            .with_for_update()
+            .first()
+        )
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return agent
+
+@router.post("/", summary="Create agent with knowledge & integrations")
+def create_agent_with_knowledge(
+    body: AgentRequestBody,
+    db: Session = Depends(get_db),
+    admission: AdmissionController = Depends(get_admission),
+):
+    admission.check_rate(body.agent.client_id, "agent:create")
+    has_uploads = any(k.file_blob_base64 for k in body.knowledge)
+
+    with admission.upload_slot(body.agent.client_id) if has_uploads else nullcontext():
+        return _create_agent(body, db)
+
+def _create_agent(body: AgentRequestBody, db: Session) -> dict:
+    # 1) Upload files first so the transaction isn't held open across Azure calls
+    urls = []
+    for k in body.knowledge:
+        url = k.file_url
+        if k.file_blob_base64:
+            url = upload_file_to_blob(k.file_blob_base64, k.file_name)
+        urls.append(url)
+
+    # 2) Save Agent (flush to get its identity without committing)
+    db_agent = Agent(**body.agent.dict())
     db.add(db_agent)
+    db.flush()
+    agent_id = db_agent.identity
+
+    # 3) Save Knowledge entries
+    knowledge = [
+        Knowledge(
+            client_id   = body.agent.client_id,
+            agent_id    = agent_id,
+            file_name   = k.file_name,
+            file_type   = k.file_type,
+            file_size   = k.file_size,
+            file_url    = url,
+            upload_date = k.upload_date or datetime.utcnow(),
+        )
+        for k, url in zip(body.knowledge, urls)
+    ]
+
+    # 4) Save Integrations
+    integrations = [
+        Integration(
+            client_id    = body.agent.client_id,
+            agent_id     = agent_id,
+            type         = i.type,
+            status       = i.status,
+            config       = i.config,
+            connected_at = i.connected_at,
+        )
+        for i in body.integration
+    ]
+    db.add_all(knowledge + integrations)
+    db.flush()
+
+    # 5) Outbox rows commit atomically with the entities
+    for entity in [db_agent] + knowledge + integrations:
+        record_change(db, entity, "created")
     db.commit()
-    db.refresh(db_agent)
-    return db_agent
+    db.refresh(db_agent)   # commit expires the instance; reload before serializing
+    return {
+        "agent":        db_agent,
+        "knowledge":    [k.file_name for k in body.knowledge],
+        "integrations": [i.type for i in body.integration],
+        "agent_id":     agent_id,
+    }
 
 @router.get("/{agent_id}", summary="Get agent by ID")
-def read_agent(agent_id: int, db: Session = Depends(get_db)):
-    agent = db.query(Agent).filter(Agent.identity == agent_id).first()
+def read_agent(agent_id: int, db: Session = Depends(get_read_db)):
+    agent = db.query(Agent).filter(Agent.identity == agent_id, Agent.deleted_at.is_(None)).first()
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
     return agent
 
 @router.put("/{agent_id}", summary="Update agent by ID")
 def update_agent(agent_id: int, payload: AgentRequest, db: Session = Depends(get_db)):
-    agent = db.query(Agent).filter(Agent.identity == agent_id).first()
+    agent = db.query(Agent).filter(Agent.identity == agent_id, Agent.deleted_at.is_(None)).first()
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
     for k, v in payload.dict().items():
         setattr(agent, k, v)
+    record_change(db, agent, "updated")
     db.commit()
     db.refresh(agent)
     return agent
 
 @router.delete("/{agent_id}", summary="Delete agent by ID")
 def delete_agent(agent_id: int, db: Session = Depends(get_db)):
-    agent = db.query(Agent).filter(Agent.identity == agent_id).first()
+    agent = db.query(Agent).filter(Agent.identity == agent_id, Agent.deleted_at.is_(None)).first()
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
-    db.delete(agent)
+    # mark only; lib.reaper removes rows and blobs later in batches
+    now = datetime.utcnow()
+    agent.deleted_at = now
+    for child in (Knowledge, Integration):
+        db.execute(
+            update(child)
+            .where(child.agent_id == agent_id, child.deleted_at.is_(None))
+            .values(deleted_at=now)
+        )
+    # one event for the agent; consumers drop its knowledge and integrations with it
+    record_change(db, agent, "deleted")
     db.commit()
     return {"message": "Agent deleted successfully"}
@@ -1,10 +1,13 @@
+import os
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from src.schemas import CalendarCodeExchangeRequest, IntegrationRequest
-from src.models import Integration, get_db
-from src.lib.oauth_helpers import exchange_code_to_tokens
-from src.lib.crypto import encrypt
+from schemas import CalendarCodeExchangeRequest, IntegrationRequest
+from models import Integration, get_db
+from lib.oauth_helpers import exchange_code_to_tokens
+from lib.crypto import encrypt
+from lib.changes import record_change
+from src.routes.agent import require_live_agent
 
 router = APIRouter()
 
@@ -13,25 +16,37 @@ def google_calendar_callback(payload: CalendarCodeExchangeRequest, db: Session =
     tokens = exchange_code_to_tokens(
         code=payload.code,
         verifier=payload.verifier,
-        redirect_uri="http://localhost:8000/integrations/google/calendar/callback"
+        redirect_uri=os.getenv("GOOGLE_CALENDAR_REDIRECT_URI", "http://localhost:8000/integrations/google/calendar/callback")
     )
+    require_live_agent(db, payload.agent_id)
     integ = db.query(Integration).filter(
         Integration.client_id == payload.client_id,
         Integration.agent_id == payload.agent_id,
-        Integration.type == "google-calendar"
+        Integration.type == "google-calendar",
+        Integration.deleted_at.is_(None)
     ).first()
+    op = "updated" if integ else "created"
     if not integ:
         integ = Integration(
             client_id=payload.client_id,
             agent_id=payload.agent_id,
             type="google-calendar",
-            connected_at=datetime.utcnow().isoformat()
+            connected_at=datetime.utcnow()
         )
         db.add(integ)
     integ.access_token = encrypt(tokens["access_token"])
     integ.refresh_token = encrypt(tokens["refresh_token"])
     integ.expires_at = datetime.utcnow() + timedelta(seconds=tokens["expires_in"])
     integ.status = "connected"
+    db.flush()
+    record_change(db, integ, op)
     db.commit()
     db.refresh(integ)
-    return IntegrationRequest(**integ.__dict__)
+    return IntegrationRequest(
+        client_id=integ.client_id,
+        agent_id=integ.agent_id,
+        type=integ.type,
+        status=integ.status,
+        config=integ.config or "{}",
+        connected_at=integ.connected_at
+    )
@@ -1,19 +1,56 @@
+import os
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from src.schemas import CodeExchangeRequest, GoogleLoginResponse
-from src.models import User, get_db
-from src.lib.oauth_helpers import exchange_code_to_tokens
-from src.lib.crypto import encrypt
+from schemas import GooglePKCERequest, GoogleProfileRequest, GoogleLoginResponse
+from models import User, get_db
+from lib.oauth_helpers import exchange_code_to_tokens
+from lib.crypto import encrypt
 
 router = APIRouter()
 
+@router.post("", response_model=GoogleLoginResponse)
+def google_profile_login(payload: GoogleProfileRequest, db: Session = Depends(get_db)):
+    """
+    Accepts a Google user profile + access_token from the front end,
+    upserts the User, encrypts & stores access_token, and returns client_id.
+    """
+    # implicit flow tokens usually expire in 3600s
+    expires_at = datetime.utcnow() + timedelta(seconds=3600)
+
+    user = db.query(User).filter(User.email == payload.email).first()
+    if not user:
+        user = User(
+            full_name=payload.full_name,
+            email=payload.email,
+            profile_picture=payload.profile_picture,
+            provider=payload.provider,
+            access_token=encrypt(payload.access_token),
+            refresh_token="",           # no refresh_token in implicit flow
+            expires_at=expires_at
+        )
+        db.add(user)
+    else:
+        user.full_name = payload.full_name
+        user.profile_picture = payload.profile_picture
+        user.access_token = encrypt(payload.access_token)
+        user.expires_at = expires_at
+    db.commit()
+    return GoogleLoginResponse(
+        client_id=user.client_id,
+        message="Logged in successfully.",
+        full_name=user.full_name,
+        email=user.email,
+        profile_picture=user.profile_picture,
+        provider=user.provider
+    )
+
 @router.post("/callback", response_model=GoogleLoginResponse)
-def google_login_callback(payload: CodeExchangeRequest, db: Session = Depends(get_db)):
+def google_login_callback(payload: GooglePKCERequest, db: Session = Depends(get_db)):
     tokens = exchange_code_to_tokens(
         code=payload.code,
         verifier=payload.verifier,
-        redirect_uri="http://localhost:8000/auth/google/callback"
+        redirect_uri=os.getenv("GOOGLE_LOGIN_REDIRECT_URI", "http://localhost:8000/auth/google/callback")
     )
     user = db.query(User).filter(User.email == tokens["email"]).first()
     if not user:
@@ -33,7 +70,8 @@ def google_login_callback(payload: CodeExchangeRequest, db: Session = Depends(ge
     return GoogleLoginResponse(
         client_id=user.client_id,
         message="Logged in successfully",
-        access_token=tokens["access_token"],
-        refresh_token=tokens["refresh_token"],
-        expires_at=user.expires_at
+        full_name=user.full_name,
+        email=user.email,
+        profile_picture=user.profile_picture,
+        provider=user.provider
     )
@@ -0,0 +1,228 @@
+import json
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+import config
+from models import Agent, Knowledge, Integration, get_db, read_engine_for
+from schemas import AgentRequest, AgentRequestBody, KnowledgeRequest, IntegrationRequest
+from storage.blob import upload_file_to_blob
+from lib.changes import record_changes
+from lib.rate_limit import AdmissionController, get_admission
+
+router = APIRouter()
+
+# -------------------- Export --------------------
+
+def _export_config(raw) -> str:
+    """
+    Stored integration config as the JSON object import requires. Legacy
+    text that isn't one is wrapped as {"legacy": "<original text>"}.
+    """
+    if not raw:
+        return "{}"
+    try:
+        if isinstance(json.loads(raw), dict):
+            return raw
+    except ValueError:
+        pass
+    return json.dumps({"legacy": raw})
+
+def _children_by_agent(conn, model, agent_ids: list) -> dict:
+    grouped = defaultdict(list)
+    rows = conn.execute(
+        select(model)
+        .where(model.agent_id.in_(agent_ids), model.deleted_at.is_(None))
+        .order_by(model.agent_id, model.identity)
+    )
+    for row in rows:
+        grouped[row.agent_id].append(row)
+    return grouped
+
+def _export_lines(read_engine, client_id: int):
+    """
+    One AgentRequestBody JSON document per line. Agents are read in
+    keyset pages of EXPORT_PAGE_SIZE, each followed by its children via
+    `agent_id IN (...)`. Everything runs in one transaction on one
+    connection, so the export is a single consistent snapshot and memory
+    is bounded by a page.
+    """
+    with read_engine.connect() as conn:
+        last_id = 0
+        while True:
+            agents = conn.execute(
+                select(Agent)
+                .where(Agent.client_id == client_id, Agent.deleted_at.is_(None), Agent.identity > last_id)
+                .order_by(Agent.identity)
+                .limit(config.EXPORT_PAGE_SIZE)
+            ).all()
+            if not agents:
+                return
+            agent_ids = [agent.identity for agent in agents]
+            knowledge = _children_by_agent(conn, Knowledge, agent_ids)
+            integrations = _children_by_agent(conn, Integration, agent_ids)
+
+            for agent in agents:
+                # stored rows were validated on the way in; legacy data or
+                # oversized agents must not abort the stream half-way
+                body = AgentRequestBody.model_construct(
+                    agent=AgentRequest.model_validate(agent, from_attributes=True),
+                    knowledge=[
+                        KnowledgeRequest(
+                            file_name=k.file_name,
+                            file_type=k.file_type or "",
+                            file_size=k.file_size or 0,
+                            file_url=k.file_url,
+                            client_id=k.client_id,
+                            upload_date=k.upload_date,
+                        )
+                        for k in knowledge[agent.identity]
+                    ],
+                    integration=[
+                        IntegrationRequest.model_construct(
+                            client_id=i.client_id,
+                            status=i.status or "",
+                            config=_export_config(i.config),
+                            type=i.type or "",
+                            connected_at=i.connected_at,
+                        )
+                        for i in integrations[agent.identity]
+                    ],
+                )
+                # no exclude_none: a NULL connected_at must survive the round trip
+                yield body.model_dump_json() + "\n"
+            last_id = agent_ids[-1]
+
+@router.get("/export", summary="Stream a client's agents as NDJSON")
+def export_client(
+    client_id: int,
+    request: Request,
+    admission: AdmissionController = Depends(get_admission),
+):
+    # each export holds a pooled connection for as long as the client reads
+    admission.check_rate(client_id, "export")
+    return StreamingResponse(
+        _export_lines(read_engine_for(request), client_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="client-{client_id}.ndjson"'},
+    )
+
+# -------------------- Import --------------------
+
+def _upload_batch(batch: list) -> list:
+    # per agent, the file_url of each knowledge item (uploading inline blobs)
+    return [
+        [upload_file_to_blob(k.file_blob_base64, k.file_name) if k.file_blob_base64 else k.file_url for k in body.knowledge]
+        for body in batch
+    ]
+
+def _insert_batch(db: Session, admission: AdmissionController, client_id: int, batch: list) -> None:
+    """
+    Upload the batch's inline files, then insert its agents and all their
+    knowledge and integrations with one multi-row INSERT per table, in a
+    single transaction.
+    """
+    # uploads go first, under an upload slot, so no transaction spans Azure calls
+    has_uploads = any(k.file_blob_base64 for body in batch for k in body.knowledge)
+    with admission.upload_slot(client_id) if has_uploads else nullcontext():
+        urls = _upload_batch(batch)
+
+    agents = [Agent(**{**body.agent.dict(), "client_id": client_id}) for body in batch]
+    db.add_all(agents)
+    db.flush()
+
+    knowledge, integrations = [], []
+    for agent, body, agent_urls in zip(agents, batch, urls):
+        for k, url in zip(body.knowledge, agent_urls):
+            knowledge.append({
+                "client_id": client_id, "agent_id": agent.identity,
+                "file_name": k.file_name, "file_type": k.file_type, "file_size": k.file_size,
+                "file_url": url, "upload_date": k.upload_date or datetime.utcnow(),
+            })
+        for i in body.integration:
+            integrations.append({
+                "client_id": client_id, "agent_id": agent.identity,
+                "type": i.type, "status": i.status, "config": i.config,
+                "connected_at": i.connected_at,
+            })
+    if knowledge:
+        db.execute(insert(Knowledge), knowledge)
+    if integrations:
+        db.execute(insert(Integration), integrations)
+
+    # one "created" change per row, as POST /agent/ records. Multi-row
+    # INSERTs don't return ids, but these agents are new, so every child
+    # under them is one just inserted.
+    agent_ids = [agent.identity for agent in agents]
+    children = [
+        *db.scalars(select(Knowledge).where(Knowledge.agent_id.in_(agent_ids)).order_by(Knowledge.identity)),
+        *db.scalars(select(Integration).where(Integration.agent_id.in_(agent_ids)).order_by(Integration.identity)),
+    ]
+    record_changes(db, agents + children, "created")
+    db.commit()
+
+@router.post("/import", summary="Bulk-import agents from NDJSON")
+async def import_client(
+    client_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    admission: AdmissionController = Depends(get_admission),
+):
+    """
+    Each line is an AgentRequestBody, as produced by /export. Rows are
+    re-owned by `client_id` (ids differ between environments) and written
+    in batches of IMPORT_BATCH_SIZE agents; batches already written stay
+    committed if a later line is invalid.
+    """
+    admission.check_rate(client_id, "import")
+    imported, line_no, batch, buffer = 0, 0, [], bytearray()
+
+    async def flush():
+        nonlocal imported, batch
+        if batch:
+            await run_in_threadpool(_insert_batch, db, admission, client_id, batch)
+            imported += len(batch)
+            batch = []
+
+    async def parse(line: bytes):
+        nonlocal line_no
+        line_no += 1
+        if not line.strip():
+            return
+        try:
+            batch.append(AgentRequestBody.model_validate_json(line))
+        except ValidationError as exc:
+            raise HTTPException(
+                status_code=422,
+                detail={"line": line_no, "imported": imported, "errors": exc.errors(include_url=False, include_context=False)},
+            )
+        if len(batch) >= config.IMPORT_BATCH_SIZE:
+            await flush()
+
+    async for chunk in request.stream():
+        # only the new bytes can hold a newline, and consumed lines are
+        # dropped in one go, so the work per chunk stays linear in its size
+        search, start = len(buffer), 0
+        buffer += chunk
+        while True:
+            end = buffer.find(b"\n", search)
+            if end == -1:
+                break
+            await parse(bytes(buffer[start:end]))
+            search = start = end + 1
+        del buffer[:start]
+        if len(buffer) > config.MAX_BODY_BYTES:
+            # one agent document is bounded like any other request body
+            raise HTTPException(
+                status_code=413,
+                detail={"line": line_no + 1, "imported": imported, "error": "Line too large"},
+            )
+    await parse(bytes(buffer))
+    await flush()
+    return {"imported": imported}
@@ -0,0 +1,75 @@
+import asyncio
+import json
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from models import SessionLocal
+from lib.changes import changes_since
+
+router = APIRouter()
+
+# how often an open long-poll / stream re-checks the outbox
+_POLL_INTERVAL = 0.5
+_HEARTBEAT = 15
+
+def _fetch(since: int, client_id: Optional[int], limit: int) -> list:
+    with SessionLocal() as db:
+        return changes_since(db, since, client_id, limit)
+
+@router.get("/", summary="Changes after a cursor (long-poll)")
+async def list_changes(
+    since: int = 0,
+    client_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    wait: float = Query(0, ge=0, le=30),
+):
+    """
+    Return changes with id > `since`. With `wait`, hold the request open up
+    to that many seconds until at least one change arrives.
+    Pass the last returned `id` back as `since`. A change shows up
+    CHANGE_VISIBILITY_DELAY_SECONDS after it is written.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        changes = await run_in_threadpool(_fetch, since, client_id, limit)
+        if changes or time.monotonic() >= deadline:
+            return {"changes": changes, "next_since": changes[-1]["id"] if changes else since}
+        await asyncio.sleep(_POLL_INTERVAL)
+
+@router.get("/stream", summary="Server-Sent Events stream of changes")
+async def stream_changes(
+    since: int = 0,
+    client_id: Optional[int] = None,
+    last_event_id: Optional[int] = Header(None),
+):
+    """
+    SSE stream; each event's `id` is the change id, so reconnecting clients
+    resume from Last-Event-ID automatically.
+    """
+    cursor = last_event_id if last_event_id is not None else since
+
+    async def events():
+        nonlocal cursor
+        idle = 0.0
+        while True:
+            changes = await run_in_threadpool(_fetch, cursor, client_id, 100)
+            for change in changes:
+                cursor = change["id"]
+                yield f"id: {cursor}\nevent: change\ndata: {json.dumps(change)}\n\n"
+            if changes:
+                idle = 0.0
+                continue
+            if idle >= _HEARTBEAT:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            await asyncio.sleep(_POLL_INTERVAL)
+            idle += _POLL_INTERVAL
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
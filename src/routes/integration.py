@@ -1,30 +1,37 @@
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from src.models import Integration, get_db
-from src.schemas import IntegrationRequest
+from models import Integration, get_db, get_read_db
+from schemas import IntegrationRequest
+from lib.changes import record_change
+from src.routes.agent import require_live_agent
 
 router = APIRouter()
 
 @router.post("/", summary="Create integration entry")
 def create_integration(entry: IntegrationRequest, db: Session = Depends(get_db)):
+    require_live_agent(db, entry.agent_id)
     db_integration = Integration(**entry.dict())
     db.add(db_integration)
+    db.flush()
+    record_change(db, db_integration, "created")
     db.commit()
     db.refresh(db_integration)
     return db_integration
 
 @router.get("/{integration_id}", summary="Get integration by ID")
-def read_integration(integration_id: int, db: Session = Depends(get_db)):
-    integ = db.query(Integration).filter(Integration.identity == integration_id).first()
+def read_integration(integration_id: int, db: Session = Depends(get_read_db)):
+    integ = db.query(Integration).filter(Integration.identity == integration_id, Integration.deleted_at.is_(None)).first()
     if not integ:
         raise HTTPException(status_code=404, detail="Integration not found")
     return integ
 
 @router.delete("/{integration_id}", summary="Delete integration by ID")
 def delete_integration(integration_id: int, db: Session = Depends(get_db)):
-    integ = db.query(Integration).filter(Integration.identity == integration_id).first()
+    integ = db.query(Integration).filter(Integration.identity == integration_id, Integration.deleted_at.is_(None)).first()
     if not integ:
         raise HTTPException(status_code=404, detail="Integration not found")
-    db.delete(integ)
+    integ.deleted_at = datetime.utcnow()   # row is removed by lib.reaper
+    record_change(db, integ, "deleted")
     db.commit()
     return {"message": "Integration deleted successfully"}
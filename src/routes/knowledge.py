@@ -1,16 +1,79 @@
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+from datetime import datetime
+from typing import Optional
+
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from sqlalchemy import and_, func, or_
 from sqlalchemy.orm import Session
-from src.models import Knowledge, get_db
-from src.schemas import KnowledgeRequest
-from src.storage.blob import upload_file_to_blob
+from models import Knowledge, get_db, get_read_db
+from schemas import KnowledgeRequest, KnowledgePage, KnowledgeStats
+from storage.blob import blob_name_from_url, delete_blobs, get_blob_properties, open_blob, upload_file_to_blob
+from storage.cache import get_disk_cache
+from lib.changes import record_change
+from lib.rate_limit import AdmissionController, get_admission
+from src.routes.agent import require_live_agent
 
 router = APIRouter()
 
+def _encode_cursor(k: Knowledge) -> str:
+    raw = f"{k.upload_date.isoformat()}|{k.identity}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        upload_date, identity = raw.split("|")
+        return datetime.fromisoformat(upload_date), int(identity)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _parse_range(header: Optional[str], size: int):
+    """
+    (start, end) inclusive for a single `bytes=` range, or None to serve the
+    whole blob (no header, other units, multiple ranges, bad syntax).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first == "":
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
 @router.post("/", summary="Create knowledge file entry")
-def create_knowledge(entry: KnowledgeRequest, db: Session = Depends(get_db)):
+def create_knowledge(
+    entry: KnowledgeRequest,
+    db: Session = Depends(get_db),
+    admission: AdmissionController = Depends(get_admission),
+):
+    admission.check_rate(entry.client_id, "knowledge:create")
+    # upload before the agent row lock, so no lock or transaction spans Azure calls
     file_url = entry.file_url
     if entry.file_blob_base64:
-        file_url = upload_file_to_blob(entry.file_blob_base64, entry.file_name)
+        with admission.upload_slot(entry.client_id):
+            file_url = upload_file_to_blob(entry.file_blob_base64, entry.file_name)
+    try:
+        require_live_agent(db, entry.agent_id)
+    except HTTPException:
+        if entry.file_blob_base64:
+            delete_blobs([blob_name_from_url(file_url)])   # don't orphan the upload
+        raise
     db_knowledge = Knowledge(
         client_id=entry.client_id,
         agent_id=entry.agent_id,
@@ -18,25 +81,122 @@ def create_knowledge(entry: KnowledgeRequest, db: Session = Depends(get_db)):
         file_type=entry.file_type,
         file_size=entry.file_size,
         file_url=file_url,
-        upload_date=entry.upload_date,
+        upload_date=entry.upload_date or datetime.utcnow(),
     )
     db.add(db_knowledge)
+    db.flush()
+    record_change(db, db_knowledge, "created")
     db.commit()
     db.refresh(db_knowledge)
     return db_knowledge
 
+@router.get("/", response_model=KnowledgePage, summary="List an agent's knowledge files")
+def list_knowledge(
+    agent_id: int,
+    file_type: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Newest first, keyset-paginated on (upload_date, identity).
+    Pass the returned `next_cursor` back as `cursor` for the next page.
+    """
+    query = db.query(Knowledge).filter(Knowledge.agent_id == agent_id, Knowledge.deleted_at.is_(None))
+    if file_type:
+        query = query.filter(Knowledge.file_type == file_type)
+    if name_prefix:
+        query = query.filter(Knowledge.file_name.like(f"{_escape_like(name_prefix)}%", escape="\\"))
+    if cursor:
+        upload_date, identity = _decode_cursor(cursor)
+        query = query.filter(or_(
+            Knowledge.upload_date < upload_date,
+            and_(Knowledge.upload_date == upload_date, Knowledge.identity < identity),
+        ))
+    rows = (
+        query.order_by(Knowledge.upload_date.desc(), Knowledge.identity.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    items = rows[:limit]
+    next_cursor = _encode_cursor(items[-1]) if len(rows) > limit else None
+    return KnowledgePage(items=items, next_cursor=next_cursor)
+
+@router.get("/stats", response_model=KnowledgeStats, summary="File count and total size for an agent")
+def knowledge_stats(agent_id: int, db: Session = Depends(get_read_db)):
+    file_count, total_size = (
+        db.query(func.count(Knowledge.identity), func.coalesce(func.sum(Knowledge.file_size), 0))
+        .filter(Knowledge.agent_id == agent_id, Knowledge.deleted_at.is_(None))
+        .one()
+    )
+    return KnowledgeStats(agent_id=agent_id, file_count=file_count, total_size=total_size)
+
 @router.get("/{knowledge_id}", summary="Get knowledge file by ID")
-def read_knowledge(knowledge_id: int, db: Session = Depends(get_db)):
-    k = db.query(Knowledge).filter(Knowledge.identity == knowledge_id).first()
+def read_knowledge(knowledge_id: int, db: Session = Depends(get_read_db)):
+    k = db.query(Knowledge).filter(Knowledge.identity == knowledge_id, Knowledge.deleted_at.is_(None)).first()
     if not k:
         raise HTTPException(status_code=404, detail="Knowledge file not found")
     return k
 
 @router.delete("/{knowledge_id}", summary="Delete knowledge file by ID")
 def delete_knowledge(knowledge_id: int, db: Session = Depends(get_db)):
-    k = db.query(Knowledge).filter(Knowledge.identity == knowledge_id).first()
+    k = db.query(Knowledge).filter(Knowledge.identity == knowledge_id, Knowledge.deleted_at.is_(None)).first()
     if not k:
         raise HTTPException(status_code=404, detail="Knowledge file not found")
-    db.delete(k)
+    k.deleted_at = datetime.utcnow()   # blob and row are removed by lib.reaper
+    record_change(db, k, "deleted")
     db.commit()
     return {"message": "Knowledge deleted successfully"}
+
+@router.get("/{knowledge_id}/content", summary="Download knowledge file content")
+def read_knowledge_content(knowledge_id: int, request: Request, db: Session = Depends(get_read_db)):
+    """
+    Stream the file from blob storage, honouring a single HTTP Range.
+    Files under BLOB_CACHE_MAX_FILE_BYTES are served from the shared disk
+    cache when it is enabled; anything else is streamed chunk by chunk.
+    """
+    k = db.query(Knowledge).filter(Knowledge.identity == knowledge_id, Knowledge.deleted_at.is_(None)).first()
+    if not k:
+        raise HTTPException(status_code=404, detail="Knowledge file not found")
+    blob_name = blob_name_from_url(k.file_url)
+    if not blob_name:
+        if not k.file_url:
+            raise HTTPException(status_code=404, detail="Knowledge file has no content")
+        return RedirectResponse(k.file_url)   # hosted elsewhere
+
+    try:
+        return _blob_response(blob_name, k.file_name, request.headers.get("range"))
+    except ResourceNotFoundError:
+        raise HTTPException(status_code=404, detail="Knowledge file content is missing")
+    except ResourceModifiedError:
+        # overwritten between reading its properties and starting the download
+        raise HTTPException(status_code=412, detail="Knowledge file changed, retry")
+
+def _blob_response(blob_name: str, file_name: str, range_header: Optional[str]):
+    props = get_blob_properties(blob_name)
+    media_type = props.content_settings.content_type or "application/octet-stream"
+
+    cache = get_disk_cache()
+    if cache and cache.accepts(props.size):
+        path = cache.get(blob_name, props.etag) or cache.put(
+            blob_name, props.etag, lambda f: open_blob(blob_name, props.etag).readinto(f)
+        )
+        # FileResponse handles Range / If-Range itself
+        return FileResponse(path, media_type=media_type, filename=file_name, content_disposition_type="inline")
+
+    headers = {"Accept-Ranges": "bytes", "ETag": props.etag}
+    byte_range = _parse_range(range_header, props.size)
+    if byte_range is None:
+        headers["Content-Length"] = str(props.size)
+        return StreamingResponse(open_blob(blob_name, props.etag).chunks(), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{props.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        open_blob(blob_name, props.etag, offset=start, length=end - start + 1).chunks(),
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
+    )
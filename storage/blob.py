@@ -1,17 +1,70 @@
 import base64
 import uuid
 import os
-from azure.storage.blob import BlobServiceClient
+from functools import lru_cache
+from azure.core import MatchConditions
+from azure.storage.blob import BlobServiceClient, ContainerClient
 
-_connection = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-_container = os.getenv("AZURE_CONTAINER_NAME")
-_blob_service = BlobServiceClient.from_connection_string(_connection)
-_container_client = _blob_service.get_container_client(_container)
+# One client per process, created on first use so importing this module
+# never needs Azure credentials and every router shares the same
+# connection pool.
+
+@lru_cache(maxsize=None)
+def get_blob_service() -> BlobServiceClient:
+    return BlobServiceClient.from_connection_string(os.getenv("AZURE_STORAGE_CONNECTION_STRING"))
+
+@lru_cache(maxsize=None)
+def get_container_client() -> ContainerClient:
+    return get_blob_service().get_container_client(os.getenv("AZURE_CONTAINER_NAME"))
 
 def upload_file_to_blob(file_base64: str, file_name: str) -> str:
+    """
+    Upload a base64-encoded file to Azure Blob Storage and return its URL.
+    """
     content = base64.b64decode(file_base64)
     blob_name = f"{uuid.uuid4()}_{file_name}"
-    blob_client = _container_client.get_blob_client(blob_name)
-    blob_client.upload_blob(content, overwrite=True)
-    account = _blob_service.account_name
-    return f"https://{account}.blob.core.windows.net/{_container}/{blob_name}"
+    container = get_container_client()
+    container.get_blob_client(blob_name).upload_blob(content, overwrite=True)
+    account = get_blob_service().account_name
+    return f"https://{account}.blob.core.windows.net/{container.container_name}/{blob_name}"
+
+def get_blob_properties(blob_name: str):
+    return get_container_client().get_blob_client(blob_name).get_blob_properties()
+
+def open_blob(blob_name: str, etag: str, offset: int = None, length: int = None):
+    """
+    Start a download of `blob_name` (optionally a byte range), pinned to
+    `etag` so a concurrent overwrite can't splice two versions together.
+    Iterate `.chunks()` to stream or call `.readinto(f)` to copy to a file.
+    """
+    return get_container_client().get_blob_client(blob_name).download_blob(
+        offset=offset,
+        length=length,
+        etag=etag,
+        match_condition=MatchConditions.IfNotModified,
+    )
+
+def blob_name_from_url(file_url: str):
+    """
+    Blob name for a URL produced by `upload_file_to_blob`, or None if the
+    URL points somewhere else (externally hosted knowledge files).
+    """
+    if not file_url:
+        return None
+    container = get_container_client()
+    prefix = f"https://{get_blob_service().account_name}.blob.core.windows.net/{container.container_name}/"
+    if not file_url.startswith(prefix):
+        return None
+    return file_url[len(prefix):]
+
+# Azure batch requests accept at most 256 sub-requests
+_DELETE_BATCH = 256
+
+def delete_blobs(blob_names) -> None:
+    """
+    Delete blobs in batched requests; missing blobs are ignored.
+    """
+    names = list(blob_names)
+    container = get_container_client()
+    for start in range(0, len(names), _DELETE_BATCH):
+        container.delete_blobs(*names[start:start + _DELETE_BATCH], raise_on_any_failure=False)
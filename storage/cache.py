@@ -0,0 +1,87 @@
+import hashlib
+import os
+import tempfile
+from functools import lru_cache
+
+import config
+
+
+class DiskCache:
+    """
+    Bounded on-disk LRU cache for blob contents, keyed by blob name + etag.
+
+    Safe to share one directory between workers: entries are written to a
+    temp file and atomically renamed into place, and recency is tracked via
+    file mtimes rather than in-process state.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_file_bytes: int):
+        self.directory      = directory
+        self.max_bytes      = max_bytes
+        self.max_file_bytes = max_file_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str, etag: str) -> str:
+        key = hashlib.sha256(f"{name}\0{etag}".encode()).hexdigest()
+        return os.path.join(self.directory, key)
+
+    def accepts(self, size: int) -> bool:
+        return size <= self.max_file_bytes
+
+    def get(self, name: str, etag: str):
+        """
+        Path to the cached file, or None on a miss.
+        """
+        path = self._path(name, etag)
+        try:
+            os.utime(path)   # mark as recently used
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, name: str, etag: str, write) -> str:
+        """
+        Store an entry by calling `write(fileobj)`, then evict down to size.
+        """
+        path = self._path(name, etag)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._evict()
+        return path
+
+    def _evict(self) -> None:
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:   # evicted by another worker
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+@lru_cache(maxsize=None)
+def get_disk_cache():
+    """
+    Process-wide cache, or None when BLOB_CACHE_DIR is not configured.
+    """
+    if not config.BLOB_CACHE_DIR:
+        return None
+    return DiskCache(config.BLOB_CACHE_DIR, config.BLOB_CACHE_MAX_BYTES, config.BLOB_CACHE_MAX_FILE_BYTES)
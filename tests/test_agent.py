@@ -7,4 +7,17 @@ def test_create_and_read_agent():
     res = client.post("/agent/", json=payload)
     assert res.status_code == 200
     data = res.json()
-    assert data["identity"]
+    assert data["agent"]["identity"] == data["agent_id"]
+
+def test_delete_agent_is_soft_then_reaped():
+    from models import SessionLocal, Knowledge
+    from lib.reaper import reap_deleted
+    client = TestClient(app)
+    payload = {"agent": {"agent_type":"inbound","campaign_name":"X","industry":"tech","company_name":"C","agent_name":"A","agent_voice":"V","agent_role":"sales","client_id":42},"knowledge":[{"file_name":"doc.pdf","file_type":"pdf","file_size":1,"client_id":42}],"integration":[]}
+    agent_id = client.post("/agent/", json=payload).json()["agent_id"]
+    assert client.delete(f"/agent/{agent_id}").status_code == 200
+    assert client.get(f"/agent/{agent_id}").status_code == 404
+    assert client.get("/knowledge/", params={"agent_id":agent_id}).json()["items"] == []
+    with SessionLocal() as db:
+        assert reap_deleted(db, batch_size=1) >= 2
+        assert db.query(Knowledge).filter(Knowledge.agent_id == agent_id).count() == 0
@@ -0,0 +1,29 @@
+import os
+import pytest
+from fastapi import HTTPException
+from storage.cache import DiskCache
+from src.routes.knowledge import _parse_range
+
+def test_parse_range():
+    assert _parse_range(None, 100) is None
+    assert _parse_range("bytes=0-9", 100) == (0, 9)
+    assert _parse_range("bytes=90-", 100) == (90, 99)
+    assert _parse_range("bytes=-10", 100) == (90, 99)
+    assert _parse_range("bytes=50-500", 100) == (50, 99)
+    assert _parse_range("bytes=0-1,5-6", 100) is None
+    with pytest.raises(HTTPException) as exc:
+        _parse_range("bytes=100-", 100)
+    assert exc.value.status_code == 416
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=20, max_file_bytes=10)
+    assert not cache.accepts(11)
+    a = cache.put("a", "e1", lambda f: f.write(b"x" * 10))
+    b = cache.put("b", "e1", lambda f: f.write(b"y" * 10))
+    os.utime(a, (0, 0))
+    os.utime(b, (1, 1))
+    assert cache.get("a", "e1") == a        # touch: now most recent
+    cache.put("c", "e1", lambda f: f.write(b"z" * 10))
+    assert cache.get("b", "e1") is None
+    assert cache.get("a", "e1") and cache.get("c", "e1")
+    assert cache.get("a", "e2") is None     # new etag is a different entry
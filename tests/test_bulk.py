@@ -0,0 +1,105 @@
+import json
+from fastapi.testclient import TestClient
+from main import app
+
+def test_export_then_import_roundtrip(monkeypatch):
+    import config
+    monkeypatch.setattr(config, "EXPORT_PAGE_SIZE", 2)   # three agents span two pages
+    client = TestClient(app)
+    agent = {"agent_type":"inbound","campaign_name":"X","industry":"tech","company_name":"C","agent_name":"A","agent_voice":"V","agent_role":"sales","client_id":91}
+    for n in range(3):
+        knowledge = [{"file_name":f"f{n}-{j}.pdf","file_type":"pdf","file_size":1,"client_id":91} for j in range(n)]
+        assert client.post("/agent/", json={"agent":{**agent, "agent_name":f"A{n}"},"knowledge":knowledge,"integration":[]}).status_code == 200
+    res = client.get("/export", params={"client_id":91})
+    assert res.status_code == 200
+    lines = [json.loads(l) for l in res.text.splitlines()]
+    assert [len(l["knowledge"]) for l in lines] == [0, 1, 2]
+
+    res = client.post("/import", params={"client_id":92}, content=res.text.encode())
+    assert res.json() == {"imported": 3}
+    copied = [json.loads(l) for l in client.get("/export", params={"client_id":92}).text.splitlines()]
+    assert [l["agent"]["agent_name"] for l in copied] == ["A0", "A1", "A2"]
+    assert all(k["client_id"] == 92 for l in copied for k in l["knowledge"])
+
+def test_import_reports_bad_line():
+    client = TestClient(app)
+    res = client.post("/import", params={"client_id":93}, content=b'{"agent": {}}\n')
+    assert res.status_code == 422
+    assert res.json()["detail"]["line"] == 1
+
+def test_roundtrip_keeps_null_connected_at():
+    from models import Integration, SessionLocal
+    client = TestClient(app)
+    agent = {"agent_type":"inbound","campaign_name":"X","industry":"tech","company_name":"C","agent_name":"A","agent_voice":"V","agent_role":"sales","client_id":94}
+    agent_id = client.post("/agent/", json={"agent":agent,"knowledge":[],"integration":[]}).json()["agent_id"]
+    with SessionLocal() as db:
+        db.add(Integration(client_id=94, agent_id=agent_id, type="calendar", status="pending", config="{}", connected_at=None))
+        db.commit()
+    exported = client.get("/export", params={"client_id":94}).text
+    assert json.loads(exported)["integration"][0]["connected_at"] is None
+    assert client.post("/import", params={"client_id":95}, content=exported.encode()).json() == {"imported": 1}
+    copied = json.loads(client.get("/export", params={"client_id":95}).text)
+    assert copied["integration"][0]["connected_at"] is None
+
+def test_import_uploads_before_insert_under_slot(monkeypatch):
+    import src.routes.bulk as bulk
+    admission = app.state.admission
+    seen = []
+    def upload(data, name):
+        seen.append(admission.backend.acquire("uploads:96", admission.max_uploads))
+        admission.backend.release("uploads:96")
+        return f"https://blobs.example/{name}"
+    # hold all but one slot: the upload itself must be holding the last
+    for _ in range(admission.max_uploads - 1):
+        admission.backend.acquire("uploads:96", admission.max_uploads)
+    monkeypatch.setattr(bulk, "upload_file_to_blob", upload)
+    try:
+        agent = {"agent_type":"inbound","campaign_name":"X","industry":"tech","company_name":"C","agent_name":"A","agent_voice":"V","agent_role":"sales","client_id":96}
+        line = {"agent":agent,"knowledge":[{"file_name":"a.txt","file_type":"txt","file_size":1,"client_id":96,"file_blob_base64":"YQ=="}],"integration":[]}
+        res = TestClient(app).post("/import", params={"client_id":96}, content=json.dumps(line).encode())
+        assert res.json() == {"imported": 1}
+    finally:
+        for _ in range(admission.max_uploads - 1):
+            admission.backend.release("uploads:96")
+    assert seen == [False]
+    exported = json.loads(TestClient(app).get("/export", params={"client_id":96}).text)
+    assert exported["knowledge"][0]["file_url"] == "https://blobs.example/a.txt"
+
+def test_import_rejects_oversized_line(monkeypatch):
+    import config
+    monkeypatch.setattr(config, "MAX_BODY_BYTES", 1024)
+    client = TestClient(app)
+    chunks = (b"x" * 512 for _ in range(4))   # one 2 KiB line, never terminated
+    res = client.post("/import", params={"client_id":98}, content=chunks)
+    assert res.status_code == 413
+    assert res.json()["detail"]["line"] == 1
+
+def test_import_records_changes_for_children(monkeypatch):
+    import config
+    monkeypatch.setattr(config, "CHANGE_VISIBILITY_DELAY_SECONDS", 0)
+    client = TestClient(app)
+    since = client.get("/changes/", params={"client_id":99}).json()["next_since"]
+    agent = {"agent_type":"inbound","campaign_name":"X","industry":"tech","company_name":"C","agent_name":"A","agent_voice":"V","agent_role":"sales","client_id":1}
+    line = {"agent":agent,
+            "knowledge":[{"file_name":"k.pdf","file_type":"pdf","file_size":1,"client_id":1}],
+            "integration":[{"client_id":1,"status":"connected","config":"{}","type":"crm","connected_at":"2025-04-20T00:00:00Z"}]}
+    assert client.post("/import", params={"client_id":99}, content=json.dumps(line).encode()).json() == {"imported": 1}
+    changes = client.get("/changes/", params={"since":since,"client_id":99}).json()["changes"]
+    assert [(c["entity_type"], c["op"]) for c in changes] == [("Agents", "created"), ("Knowledge", "created"), ("Integrations", "created")]
+    assert changes[1]["payload"]["file_name"] == "k.pdf" and changes[1]["agent_id"] == changes[0]["entity_id"]
+
+def test_roundtrip_wraps_legacy_config():
+    from models import Integration, SessionLocal
+    client = TestClient(app)
+    agent = {"agent_type":"inbound","campaign_name":"X","industry":"tech","company_name":"C","agent_name":"A","agent_voice":"V","agent_role":"sales","client_id":100}
+    agent_id = client.post("/agent/", json={"agent":agent,"knowledge":[],"integration":[]}).json()["agent_id"]
+    with SessionLocal() as db:
+        for config in ["api_key=abc", "[1, 2]", '{"ok": true}']:
+            db.add(Integration(client_id=100, agent_id=agent_id, type="crm", status="connected", config=config))
+        db.commit()
+    exported = client.get("/export", params={"client_id":100}).text
+    assert client.post("/import", params={"client_id":101}, content=exported.encode()).json() == {"imported": 1}
+    copied = json.loads(client.get("/export", params={"client_id":101}).text)
+    assert [json.loads(i["config"]) for i in copied["integration"]] == [
+        {"legacy": "api_key=abc"}, {"legacy": "[1, 2]"}, {"ok": True},
+    ]
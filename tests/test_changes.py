@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from fastapi.testclient import TestClient
+import config
+from main import app
+from models import Change, SessionLocal
+
+AGENT = {"agent_type":"inbound","campaign_name":"X","industry":"tech","company_name":"C","agent_name":"A","agent_voice":"V","agent_role":"sales","client_id":77}
+
+def test_change_feed_after_cursor(monkeypatch):
+    monkeypatch.setattr(config, "CHANGE_VISIBILITY_DELAY_SECONDS", 0)
+    client = TestClient(app)
+    since = client.get("/changes/", params={"client_id":77}).json()["next_since"]
+    agent_id = client.post("/agent/", json={"agent":AGENT,"knowledge":[],"integration":[]}).json()["agent_id"]
+    assert client.put(f"/agent/{agent_id}", json={**AGENT, "agent_name":"B"}).status_code == 200
+    res = client.get("/changes/", params={"since":since,"client_id":77}).json()
+    assert [(c["entity_id"], c["op"]) for c in res["changes"]] == [(agent_id, "created"), (agent_id, "updated")]
+    assert res["changes"][1]["payload"]["agent_name"] == "B"
+    assert client.get("/changes/", params={"since":res["next_since"],"client_id":77}).json()["changes"] == []
+
+def test_change_feed_holds_back_recent_rows(monkeypatch):
+    monkeypatch.setattr(config, "CHANGE_VISIBILITY_DELAY_SECONDS", 0)
+    client = TestClient(app)
+    since = client.get("/changes/", params={"client_id":78}).json()["next_since"]
+    monkeypatch.setattr(config, "CHANGE_VISIBILITY_DELAY_SECONDS", 60)
+    client.post("/agent/", json={"agent":{**AGENT, "client_id":78},"knowledge":[],"integration":[]})
+    assert client.get("/changes/", params={"since":since,"client_id":78}).json()["changes"] == []
+    monkeypatch.setattr(config, "CHANGE_VISIBILITY_DELAY_SECONDS", 0)
+    assert len(client.get("/changes/", params={"since":since,"client_id":78}).json()["changes"]) == 1
+
+def test_reaper_trims_old_changes(monkeypatch):
+    from lib.reaper import reap_deleted
+    monkeypatch.setattr(config, "WEBHOOK_URL", "http://hook.invalid")
+    old = datetime.utcnow() - timedelta(seconds=config.CHANGE_RETENTION_SECONDS + 60)
+    with SessionLocal() as db:
+        rows = [
+            Change(client_id=79, entity_type="Agents", entity_id=1, op="created", created_at=old, dispatched_at=old),
+            Change(client_id=79, entity_type="Agents", entity_id=2, op="created", created_at=old),
+            Change(client_id=79, entity_type="Agents", entity_id=3, op="created"),
+        ]
+        db.add_all(rows)
+        db.commit()
+        reap_deleted(db)
+        left = db.query(Change.entity_id).filter(Change.client_id == 79).order_by(Change.entity_id).all()
+        # undelivered and recent rows stay
+        assert [r.entity_id for r in left] == [2, 3]
+        db.query(Change).filter(Change.client_id == 79).delete()
+        db.commit()
+
+def test_dispatcher_delivers_in_order_and_retries_failed_batch(monkeypatch):
+    import lib.changes as changes
+    posted, fail = [], [True]
+    class Resp:
+        def raise_for_status(self):
+            if fail[0]:
+                raise RuntimeError("webhook down")
+    def post(url, json, timeout):
+        posted.append([c["entity_id"] for c in json])
+        return Resp()
+    monkeypatch.setattr(changes.requests, "post", post)
+    old = datetime.utcnow() - timedelta(seconds=60)
+    with SessionLocal() as db:
+        db.query(Change).filter(Change.dispatched_at.is_(None)).update({"dispatched_at": old})
+        db.add_all([Change(client_id=80, entity_type="Agents", entity_id=n, op="updated", created_at=old) for n in (1, 2, 3)])
+        db.commit()
+    with pytest.raises(RuntimeError):
+        changes.dispatch_pending("http://hook.invalid", 2, 1)
+    assert posted == [[1, 2]]                  # failed batch stops the drain
+    fail[0] = False
+    assert changes.dispatch_pending("http://hook.invalid", 2, 1) == 3
+    assert posted == [[1, 2], [1, 2], [3]]     # retried before anything newer
+    with SessionLocal() as db:
+        assert db.query(Change).filter(Change.client_id == 80, Change.dispatched_at.is_(None)).count() == 0
@@ -1,9 +1,13 @@
 from fastapi.testclient import TestClient
 from main import app
 
+def create_agent(client, client_id=1):
+    agent = {"agent_type":"inbound","campaign_name":"X","industry":"tech","company_name":"C","agent_name":"A","agent_voice":"V","agent_role":"sales","client_id":client_id}
+    return client.post("/agent/", json={"agent":agent,"knowledge":[],"integration":[]}).json()["agent_id"]
+
 def test_integration_crud():
     client = TestClient(app)
-    payload = {"client_id":1,"status":"connected","config":"{}","type":"crm","connected_at":"2025-04-20T00:00:00Z"}
+    payload = {"client_id":1,"status":"connected","config":"{}","type":"crm","connected_at":"2025-04-20T00:00:00Z","agent_id":create_agent(client)}
     res = client.post("/integration/", json=payload)
     assert res.status_code == 200
     iid = res.json()["identity"]
@@ -11,3 +15,47 @@ def test_integration_crud():
     assert get_res.status_code == 200
     del_res = client.delete(f"/integration/{iid}")
     assert del_res.status_code == 200
+
+def test_integration_rejects_untyped_fields():
+    client = TestClient(app)
+    payload = {"client_id":1,"status":"connected","config":"not json","type":"crm","connected_at":"2025-04-20T00:00:00Z","agent_id":create_agent(client)}
+    assert client.post("/integration/", json=payload).status_code == 422
+    payload.update(config="{}", connected_at="yesterday")
+    assert client.post("/integration/", json=payload).status_code == 422
+
+def test_integration_for_deleted_agent_is_rejected():
+    client = TestClient(app)
+    agent_id = create_agent(client)
+    assert client.delete(f"/agent/{agent_id}").status_code == 200
+    payload = {"client_id":1,"status":"connected","config":"{}","type":"crm","connected_at":"2025-04-20T00:00:00Z","agent_id":agent_id}
+    assert client.post("/integration/", json=payload).status_code == 404
+
+def test_oversized_body_rejected_with_413():
+    client = TestClient(app)
+    res = client.post("/integration/", content=b"x" * 64, headers={"content-length": str(1024 ** 4)})
+    assert res.status_code == 413
+
+def _small_limit_client(monkeypatch):
+    import config
+    from main import create_app
+    monkeypatch.setattr(config, "MAX_BODY_BYTES", 1024)
+    monkeypatch.setattr(config, "MAX_IMPORT_BODY_BYTES", 8192)
+    return TestClient(create_app())
+
+def test_streamed_oversized_body_rejected_with_413(monkeypatch):
+    client = _small_limit_client(monkeypatch)
+    chunks = (b"x" * 256 for _ in range(16))   # chunked, no Content-Length
+    assert client.post("/integration/", content=chunks).status_code == 413
+    chunks = (b"x" * 1024 for _ in range(16))
+    assert client.post("/import", params={"client_id":1}, content=chunks).status_code == 413
+
+def test_malformed_content_length_is_400():
+    client = TestClient(app)
+    res = client.post("/integration/", content=b"{}", headers={"content-length": "abc"})
+    assert res.status_code == 400
+
+def test_long_config_is_422_not_413():
+    client = TestClient(app)
+    config = '{"k": "' + "x" * 1100 + '"}'
+    payload = {"client_id":1,"status":"connected","config":config,"type":"crm","connected_at":"2025-04-20T00:00:00Z","agent_id":create_agent(client)}
+    assert client.post("/integration/", json=payload).status_code == 422
@@ -1,9 +1,15 @@
+from datetime import datetime
+
 from fastapi.testclient import TestClient
 from main import app
 
+def create_agent(client, client_id=1):
+    agent = {"agent_type":"inbound","campaign_name":"X","industry":"tech","company_name":"C","agent_name":"A","agent_voice":"V","agent_role":"sales","client_id":client_id}
+    return client.post("/agent/", json={"agent":agent,"knowledge":[],"integration":[]}).json()["agent_id"]
+
 def test_knowledge_crud():
     client = TestClient(app)
-    payload = {"file_name":"doc.pdf","file_type":"pdf","file_size":123,"file_url":None,"file_blob_base64":None,"client_id":1}
+    payload = {"file_name":"doc.pdf","file_type":"pdf","file_size":123,"file_url":None,"file_blob_base64":None,"client_id":1,"agent_id":create_agent(client)}
     res = client.post("/knowledge/", json=payload)
     assert res.status_code == 200
     kid = res.json()["identity"]
@@ -11,3 +17,132 @@ def test_knowledge_crud():
     assert get_res.status_code == 200
     del_res = client.delete(f"/knowledge/{kid}")
     assert del_res.status_code == 200
+
+def test_knowledge_list_pagination_and_stats():
+    client = TestClient(app)
+    agent_id = create_agent(client)
+    for name in ["a.pdf", "b.pdf", "c.txt"]:
+        payload = {"file_name":name,"file_type":name.split(".")[1],"file_size":10,"client_id":1,"agent_id":agent_id}
+        assert client.post("/knowledge/", json=payload).status_code == 200
+    page = client.get("/knowledge/", params={"agent_id":agent_id,"limit":2}).json()
+    assert len(page["items"]) == 2 and page["next_cursor"]
+    rest = client.get("/knowledge/", params={"agent_id":agent_id,"limit":2,"cursor":page["next_cursor"]}).json()
+    assert len(rest["items"]) == 1 and rest["next_cursor"] is None
+    pdfs = client.get("/knowledge/", params={"agent_id":agent_id,"file_type":"pdf"}).json()
+    assert {k["file_name"] for k in pdfs["items"]} == {"a.pdf", "b.pdf"}
+    stats = client.get("/knowledge/stats", params={"agent_id":agent_id}).json()
+    assert stats["file_count"] == 3 and stats["total_size"] == 30
+
+def test_knowledge_name_prefix_matches_wildcards_literally():
+    client = TestClient(app)
+    agent_id = create_agent(client)
+    for name in ["50%_off.pdf", "50x_off.pdf", "50%Aoff.pdf", "a_b.txt", "axb.txt"]:
+        payload = {"file_name":name,"file_type":"pdf","file_size":1,"client_id":1,"agent_id":agent_id}
+        assert client.post("/knowledge/", json=payload).status_code == 200
+    def names(prefix):
+        page = client.get("/knowledge/", params={"agent_id":agent_id,"name_prefix":prefix}).json()
+        return {k["file_name"] for k in page["items"]}
+    assert names("50%_") == {"50%_off.pdf"}
+    assert names("a_") == {"a_b.txt"}
+    assert names("50") == {"50%_off.pdf", "50x_off.pdf", "50%Aoff.pdf"}
+
+def test_knowledge_for_deleted_agent_is_rejected():
+    client = TestClient(app)
+    agent_id = create_agent(client)
+    assert client.delete(f"/agent/{agent_id}").status_code == 200
+    payload = {"file_name":"doc.pdf","file_type":"pdf","file_size":1,"client_id":1,"agent_id":agent_id}
+    assert client.post("/knowledge/", json=payload).status_code == 404
+    assert client.get("/knowledge/stats", params={"agent_id":agent_id}).json()["file_count"] == 0
+
+def test_knowledge_upload_happens_before_agent_lock(monkeypatch):
+    import src.routes.knowledge as routes
+    calls, deleted = [], []
+    def upload(data, name):
+        calls.append("upload")
+        return f"https://blobs.example/{name}"
+    def require_live_agent(db, agent_id):
+        calls.append("lock")
+        return real_require(db, agent_id)
+    real_require = routes.require_live_agent
+    monkeypatch.setattr(routes, "upload_file_to_blob", upload)
+    monkeypatch.setattr(routes, "require_live_agent", require_live_agent)
+    monkeypatch.setattr(routes, "blob_name_from_url", lambda url: url.rsplit("/", 1)[-1])
+    monkeypatch.setattr(routes, "delete_blobs", deleted.extend)
+    client = TestClient(app)
+    agent_id = create_agent(client)
+    payload = {"file_name":"up.txt","file_type":"txt","file_size":1,"file_blob_base64":"YQ==","client_id":1,"agent_id":agent_id}
+    res = client.post("/knowledge/", json=payload)
+    assert res.status_code == 200 and res.json()["file_url"] == "https://blobs.example/up.txt"
+    assert calls == ["upload", "lock"] and deleted == []
+    # agent gone by the time the upload finishes: the blob is cleaned up
+    assert client.delete(f"/agent/{agent_id}").status_code == 200
+    assert client.post("/knowledge/", json=payload).status_code == 404
+    assert deleted == ["up.txt"]
+
+def test_knowledge_content_streams_ranges(monkeypatch):
+    from types import SimpleNamespace
+    from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+    import src.routes.knowledge as routes
+    data = bytes(range(100))
+
+    class FakeDownload:
+        def __init__(self, offset, length):
+            self.offset, self.length = offset or 0, length
+        def chunks(self):
+            end = len(data) if self.length is None else self.offset + self.length
+            yield data[self.offset:end]
+
+    def open_blob(name, etag, offset=None, length=None):
+        return FakeDownload(offset, length)
+
+    props = SimpleNamespace(size=len(data), etag='"e1"', content_settings=SimpleNamespace(content_type="application/pdf"))
+    monkeypatch.setattr(routes, "blob_name_from_url", lambda url: url and url.rsplit("/", 1)[-1])
+    monkeypatch.setattr(routes, "get_blob_properties", lambda name: props)
+    monkeypatch.setattr(routes, "open_blob", open_blob)
+    monkeypatch.setattr(routes, "get_disk_cache", lambda: None)
+
+    client = TestClient(app)
+    payload = {"file_name":"doc.pdf","file_type":"pdf","file_size":100,"file_url":"https://acct.blob.core.windows.net/c/doc.pdf","client_id":1,"agent_id":create_agent(client)}
+    kid = client.post("/knowledge/", json=payload).json()["identity"]
+    url = f"/knowledge/{kid}/content"
+
+    res = client.get(url)
+    assert res.status_code == 200 and res.content == data
+    assert res.headers["accept-ranges"] == "bytes" and res.headers["content-length"] == "100"
+    assert res.headers["etag"] == '"e1"' and res.headers["content-type"] == "application/pdf"
+
+    res = client.get(url, headers={"Range": "bytes=10-19"})
+    assert res.status_code == 206 and res.content == data[10:20]
+    assert res.headers["content-range"] == "bytes 10-19/100" and res.headers["content-length"] == "10"
+
+    res = client.get(url, headers={"Range": "bytes=200-"})
+    assert res.status_code == 416 and res.headers["content-range"] == "bytes */100"
+
+    def raise_(exc):
+        def fail(*args, **kwargs):
+            raise exc
+        return fail
+    monkeypatch.setattr(routes, "open_blob", raise_(ResourceModifiedError("etag changed")))
+    assert client.get(url).status_code == 412
+    monkeypatch.setattr(routes, "get_blob_properties", raise_(ResourceNotFoundError("gone")))
+    assert client.get(url).status_code == 404
+
+def test_reaper_keeps_blob_shared_with_live_row(monkeypatch):
+    import lib.reaper as reaper
+    from models import Knowledge, SessionLocal
+    deleted = []
+    monkeypatch.setattr(reaper, "blob_name_from_url", lambda url: url.rsplit("/", 1)[-1])
+    monkeypatch.setattr(reaper, "delete_blobs", deleted.extend)
+    client = TestClient(app)
+    agent_id = create_agent(client, client_id=97)
+    shared, own = "https://blobs.example/shared-97.pdf", "https://blobs.example/own-97.pdf"
+    with SessionLocal() as db:
+        db.add_all([
+            Knowledge(client_id=97, agent_id=agent_id, file_name="a", file_url=shared, deleted_at=datetime.utcnow()),
+            Knowledge(client_id=97, agent_id=agent_id, file_name="b", file_url=shared),
+            Knowledge(client_id=97, agent_id=agent_id, file_name="c", file_url=own, deleted_at=datetime.utcnow()),
+        ])
+        db.commit()
+        reaper.reap_deleted(db)
+        assert "own-97.pdf" in deleted and "shared-97.pdf" not in deleted
+        assert [k.file_name for k in db.query(Knowledge).filter(Knowledge.client_id == 97)] == ["b"]
@@ -0,0 +1,128 @@
+import pytest
+from fastapi import HTTPException
+from lib.rate_limit import AdmissionController, InMemoryBackend
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+def make_controller(clock=None, **overrides):
+    opts = dict(rate=1.0, burst=2, max_uploads=1, max_in_flight=2)
+    opts.update(overrides)
+    return AdmissionController(InMemoryBackend(clock or FakeClock()), **opts)
+
+def test_token_bucket_refills_per_client():
+    clock = FakeClock()
+    ctl = make_controller(clock)
+    ctl.check_rate(1, "agent:create")
+    ctl.check_rate(1, "agent:create")
+    with pytest.raises(HTTPException) as exc:
+        ctl.check_rate(1, "agent:create")
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "1"
+    ctl.check_rate(2, "agent:create")   # other tenants unaffected
+    clock.now += 1
+    ctl.check_rate(1, "agent:create")
+
+def test_upload_slots_are_capped_and_released():
+    ctl = make_controller()
+    with ctl.upload_slot(1):
+        with pytest.raises(HTTPException) as exc:
+            with ctl.upload_slot(1):
+                pass
+        assert exc.value.status_code == 429
+    with ctl.upload_slot(1):
+        pass
+
+def test_load_shedding_on_in_flight():
+    ctl = make_controller()
+    assert ctl.enter() and ctl.enter()
+    assert not ctl.enter()
+    ctl.exit()
+    assert ctl.enter()
+
+def test_redis_backend_with_fake_client():
+    fakeredis = pytest.importorskip("fakeredis")
+    from lib.rate_limit import RedisBackend
+    backend = RedisBackend(fakeredis.FakeStrictRedis())
+    ctl = AdmissionController(backend, rate=0.001, burst=2, max_uploads=1, max_in_flight=2)
+    ctl.check_rate(1, "agent:create")
+    ctl.check_rate(1, "agent:create")
+    with pytest.raises(HTTPException) as exc:
+        ctl.check_rate(1, "agent:create")
+    assert exc.value.status_code == 429
+    with ctl.upload_slot(1):
+        with pytest.raises(HTTPException):
+            with ctl.upload_slot(1):
+                pass
+    backend.release("uploads:1")        # extra release (e.g. after TTL expiry) must not go negative
+    with ctl.upload_slot(1):
+        with pytest.raises(HTTPException):
+            with ctl.upload_slot(1):
+                pass
+
+def test_streamed_response_counts_as_in_flight_until_sent():
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+    from fastapi.testclient import TestClient
+    from lib.rate_limit import LoadSheddingMiddleware
+    ctl = make_controller(max_in_flight=1)
+    seen = []
+    app = FastAPI()
+    @app.get("/stream")
+    def stream():
+        def body():
+            yield b"a"
+            seen.append(ctl._in_flight)
+            yield b"b"
+        return StreamingResponse(body())
+    app.add_middleware(LoadSheddingMiddleware, admission=ctl)
+    assert TestClient(app).get("/stream").text == "ab"
+    assert seen == [1] and ctl._in_flight == 0
+
+def test_idle_buckets_are_evicted():
+    clock = FakeClock()
+    backend = InMemoryBackend(clock)
+    for client_id in range(100):
+        backend.take(f"{client_id}:agent:create", 1.0, 2)
+    clock.now += 2                          # burst / rate: every bucket is full again
+    assert backend.take("0:agent:create", 1.0, 2) == 0
+    assert list(backend._buckets) == ["0:agent:create"]
+
+def test_endless_stream_does_not_hold_in_flight_slot():
+    import asyncio
+    from lib.rate_limit import LoadSheddingMiddleware
+    ctl = make_controller(max_in_flight=1, max_streams=1)
+    opened, close = asyncio.Event(), asyncio.Event()
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        if scope["path"] == "/changes/stream":
+            opened.set()
+            await close.wait()          # an SSE subscriber that never goes away
+        await send({"type": "http.response.body", "body": b""})
+
+    mw = LoadSheddingMiddleware(app, admission=ctl, stream_prefixes=("/changes",))
+
+    async def request(path):
+        statuses = []
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+        async def receive():
+            return {"type": "http.request", "body": b""}
+        await mw({"type": "http", "path": path, "headers": []}, receive, send)
+        return statuses[0]
+
+    async def scenario():
+        stream = asyncio.ensure_future(request("/changes/stream"))
+        await opened.wait()
+        assert await request("/agent/1") == 200           # ordinary traffic still admitted
+        assert await request("/changes/stream") == 503    # stream cap reached
+        close.set()
+        assert await stream == 200
+
+    asyncio.run(scenario())
+    assert ctl._in_flight == 0 and ctl._streams == 0
@@ -0,0 +1,52 @@
+import threading
+import time
+from fastapi.testclient import TestClient
+import models
+from main import app
+
+def test_reads_use_replica_with_read_your_writes(tmp_path, monkeypatch):
+    replica = models._Replica(f"sqlite:///{tmp_path}/replica.db")
+    models.Base.metadata.create_all(bind=replica.engine)
+    replica.lag, replica.checked_at = 0.0, time.monotonic()        # probed healthy
+    monkeypatch.setattr(models, "replicas", [replica])
+    client = TestClient(app)
+    payload = {"agent": {"agent_type":"inbound","campaign_name":"X","industry":"tech","company_name":"C","agent_name":"A","agent_voice":"V","agent_role":"sales","client_id":5},"knowledge":[],"integration":[]}
+    agent_id = client.post("/agent/", json=payload).json()["agent_id"]
+    assert client.get(f"/agent/{agent_id}").status_code == 200    # sticky to primary after own write
+    client.cookies.clear()
+    assert client.get(f"/agent/{agent_id}").status_code == 404    # replica hasn't got the row
+    assert client.get(f"/agent/{agent_id}", headers={"X-Read-Consistency":"primary"}).status_code == 200
+    replica.lag, replica.checked_at = None, time.monotonic()       # broken replica: fall back
+    assert client.get(f"/agent/{agent_id}").status_code == 200
+
+def test_lag_probe_does_not_block_reads(tmp_path, monkeypatch):
+    replica = models._Replica(f"sqlite:///{tmp_path}/replica.db")
+    monkeypatch.setattr(models, "replicas", [replica])
+    release, probes = threading.Event(), []
+    def slow_lag(engine):
+        probes.append(engine)
+        release.wait(5)
+        return 0.0
+    monkeypatch.setattr(models, "_replica_lag", slow_lag)
+
+    started = time.monotonic()
+    assert models.get_read_engine() is models.engine    # not probed yet: primary
+    assert models.get_read_engine() is models.engine    # probe in flight: no second one
+    assert time.monotonic() - started < 1
+    release_at = time.monotonic()
+    release.set()
+    for _ in range(100):
+        if not replica.probing:
+            break
+        time.sleep(0.01)
+    assert len(probes) == 1
+    assert replica.checked_at >= release_at               # stamped after the probe
+    assert models.get_read_engine() is replica.engine
+
+def test_saturated_replica_pool_is_skipped(tmp_path, monkeypatch):
+    replica = models._Replica(f"sqlite:///{tmp_path}/replica.db")
+    replica.lag, replica.checked_at = 0.0, time.monotonic()
+    monkeypatch.setattr(models, "replicas", [replica])
+    assert models.get_read_engine() is replica.engine
+    monkeypatch.setattr(models, "pool_utilisation", lambda engine: 1.0 if engine is replica.engine else 0.0)
+    assert models.get_read_engine() is models.engine   # reads fall back instead of waiting on the pool